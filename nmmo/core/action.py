@@ -228,7 +228,8 @@ class Attack(Node):
     rets = list(rets)
     return rets
 
-  def call(realm, entity, style, target):
+  def call(realm, entity, style, target, damage=None):
+    '''damage is precomputed by combat.resolve_attacks(), or computed here if None'''
     if style is None or target is None:
       return None
 
@@ -260,7 +261,7 @@ class Attack(Node):
     target.attacker_id.update(entity.ent_id)
 
     from nmmo.systems import combat
-    dmg = combat.attack(realm, entity, target, style.skill)
+    dmg = combat.attack(realm, entity, target, style.skill, damage)
 
     # record the combat tick for both entities
     # players and npcs both have latest_combat_tick in EntityState
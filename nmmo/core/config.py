@@ -232,6 +232,10 @@ class Config(Template):
   IMMORTAL = False
   '''Debug parameter: prevents agents from dying except by void'''
 
+  POOL_OBJECTS = False
+  '''Recycle the Player, NPC and Item objects of culled entities and destroyed items.
+     Do not keep references to entities across resets, or to items after they are destroyed'''
+
 
   ############################################################################
   ### Player Parameters
@@ -307,6 +311,38 @@ class Config(Template):
   MAP_PREVIEW_DOWNSCALE        = 1
   '''Downscaling factor for png previews'''
 
+  MAP_PREVIEW_FAST             = False
+  '''Render png previews with one pixel per tile (the mean texture color), for large maps'''
+
+  MAP_GENERATION_WORKERS       = 1
+  '''Number of processes used to generate maps. Results do not depend on this'''
+
+  MAP_CACHE_SIZE               = 16
+  '''Number of loaded maps kept in the per-process map cache. 0 disables caching'''
+
+  MAP_CACHE_MMAP               = False
+  '''Whether to memory-map map files, so that forked workers share the read-only pages'''
+
+  MAP_CONTENT_ADDRESSED        = False
+  '''Store maps in a subdirectory of PATH_MAPS named by a hash of the seed and the
+     config attributes used in generation, as listed by MAP_GENERATOR.key_attrs().
+     Existing maps are reused only when these match, and MAP_FORCE_GENERATION is ignored'''
+
+  MAP_PACK                     = False
+  '''Store all maps and fractals in a single memory-mappable file (PATH_MAP_PACK)'''
+
+  MAP_PATHFINDING_CACHE_SIZE   = 2**16
+  '''Number of A* steps kept in the per-map pathfinding cache, which is cleared on reset.
+     0 disables caching'''
+
+  MAP_FLOW_FIELD_CACHE_SIZE    = 32
+  '''Number of flow fields kept per map, each a MAP_SIZE x MAP_SIZE int8 array.
+     The least recently used goals are dropped first'''
+
+  MAP_PRECOMPUTE_FLOW_FIELDS   = False
+  '''Compute the flow fields toward the map center, quadrant centers and seize targets
+     on reset, rather than on first use. Costs a BFS per goal on every reset'''
+
 
   ############################################################################
   ### Path Parameters
@@ -331,6 +367,9 @@ class Config(Template):
   PATH_FRACTAL_SUFFIX      = 'map{}/fractal.npy'
   '''Fractal file name'''
 
+  PATH_MAP_PACK            = 'maps.npy'
+  '''Map pack file name, used when MAP_PACK is set'''
+
 
 ############################################################################
 ### Game Systems (Static Mixins)
@@ -381,6 +420,19 @@ class Terrain:
   '''Whether to scatter extra food, water on the map.
      Only works when MAP_RESET_FROM_FRACTAL is True'''
 
+  TERRAIN_NOISE_FLOAT32        = False
+  '''Compute terrain noise in single precision. Faster, but maps differ slightly'''
+
+  TERRAIN_NOISE_CHUNK_SIZE     = 2**16
+  '''Number of points per noise evaluation chunk, which bounds temporary memory'''
+
+  TERRAIN_CHUNK_ROWS           = 0
+  '''Generate the fractal this many rows at a time into memory-mapped temporary files,
+     to bound memory use on very large maps. 0 generates the whole map at once'''
+
+  TERRAIN_NOISE_CACHE_MB       = 0
+  '''Memory budget for memoizing noise layers per map seed. 0 disables memoization'''
+
 class Resource:
   '''Resource Game System'''
 
@@ -458,6 +510,10 @@ class Combat:
   COMBAT_DAMAGE_FORMULA = alt_combat_damage_formula
   '''Damage formula'''
 
+  COMBAT_BATCH_ATTACKS               = True
+  '''Compute the damage of all attacks in a tick at once, then apply the attacks in order.
+     The results are the same as resolving each attack in turn'''
+
   COMBAT_MELEE_DAMAGE                = 10
   '''Melee attack damage'''
 
@@ -580,6 +636,20 @@ class NPC:
   NPC_ALLOW_ATTACK_OTHER_NPCS         = False
   '''Whether NPCs can attack other NPCs'''
 
+  NPC_BATCH_DECISIONS                 = True
+  '''Search the closest targets and sample the random moves of all NPCs at once.
+     The actions are the same as when each NPC decides in turn'''
+
+  NPC_LOD_ENABLED                     = False
+  '''Decide and update the NPCs without a player nearby only every NPC_LOD_INTERVAL ticks.
+     Keep this off for evaluation runs, to simulate every NPC on every tick'''
+
+  NPC_LOD_RADIUS                      = 32
+  '''Distance to the closest player within which NPCs are updated every tick'''
+
+  NPC_LOD_INTERVAL                    = 8
+  '''Number of ticks between the updates of the NPCs far from every player'''
+
 
 class Item:
   '''Inventory Game System'''
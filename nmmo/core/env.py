@@ -12,7 +12,10 @@ from pettingzoo.utils.env import AgentID, ParallelEnv
 import nmmo
 from nmmo.core import realm
 from nmmo.core import game_api
+from nmmo.core import map_pack
 from nmmo.core.config import Default
+from nmmo.core.map_cache import MAP_CACHE
+from nmmo.core.terrain import map_directory
 from nmmo.core.observation import Observation
 from nmmo.core.tile import Tile
 from nmmo.entity.entity import Entity
@@ -44,10 +47,14 @@ class Env(ParallelEnv):
     self.config.env_initialized = True
 
     # Generate maps if they do not exist
-    config.MAP_GENERATOR(config).generate_all_maps(self._np_seed)
+    # NOTE: content-addressed maps are keyed by the given seed, so that unseeded envs share maps
+    map_seed = seed if config.MAP_CONTENT_ADDRESSED else self._np_seed
+    config.MAP_GENERATOR(config).generate_all_maps(map_seed)
+    self._path_maps = map_directory(config, map_seed)
     self.realm = realm.Realm(config, self._np_random)
     self.tile_map = None
     self.tile_obs_shape = None
+    self._fog_obs_key = None
 
     self.possible_agents = self.config.POSSIBLE_AGENTS
     self._alive_agents = None
@@ -252,6 +259,7 @@ class Env(ParallelEnv):
     if self.config.PROVIDE_DEATH_FOG_OBS:
       fog_map = np.round(self.realm.fog_map)[:,:,np.newaxis].astype(np.int16)
       self.tile_map = np.concatenate((self.tile_map, fog_map), axis=-1)
+      self._fog_obs_key = self.realm.fog_round_key
     self.tile_obs_shape = (self.config.PLAYER_VISION_DIAMETER**2, self.tile_map.shape[-1])
 
     # Reset the obs, game state generator
@@ -281,13 +289,23 @@ class Env(ParallelEnv):
     '''Loads a map file, which is a 2D numpy array'''
     map_dict= {}
     map_id = map_id or self._np_random.integers(self.config.MAP_N) + 1
-    map_file_path = os.path.join(self.config.PATH_CWD, self.config.PATH_MAPS,
-                                 self.config.PATH_MAP_SUFFIX.format(map_id))
-    map_dict["map"] = np.load(map_file_path)
+    cache_size, mmap = self.config.MAP_CACHE_SIZE, self.config.MAP_CACHE_MMAP
+    if self.config.MAP_PACK:
+      # The pack is always memory-mapped, so only the selected map is read
+      record = MAP_CACHE.load(map_pack.pack_path(self.config, self._path_maps),
+                              cache_size, mmap=True)[map_id-1]
+      map_dict["map"] = record["map"].astype(int)
+      if self.config.MAP_RESET_FROM_FRACTAL:
+        map_dict["fractal"] = record["fractal"].astype(float)
+      return map_dict
+
+    map_file_path = os.path.join(self._path_maps, self.config.PATH_MAP_SUFFIX.format(map_id))
+    # NOTE: the cached map is read-only, and Map._process_map() modifies its input
+    map_dict["map"] = np.array(MAP_CACHE.load(map_file_path, cache_size, mmap))
     if self.config.MAP_RESET_FROM_FRACTAL:
-      fractal_file_path = os.path.join(self.config.PATH_CWD, self.config.PATH_MAPS,
+      fractal_file_path = os.path.join(self._path_maps,
                                        self.config.PATH_FRACTAL_SUFFIX.format(map_id))
-      map_dict["fractal"] = np.load(fractal_file_path).astype(float)
+      map_dict["fractal"] = MAP_CACHE.load(fractal_file_path, cache_size, mmap).astype(float)
     return map_dict
 
   def _map_task_to_agent(self):
@@ -441,7 +459,10 @@ class Env(ParallelEnv):
       if self.config.EXCHANGE_SYSTEM_ENABLED else None
     self._update_comm_obs()
     if self.config.PROVIDE_DEATH_FOG_OBS:
-      self.tile_map[:, :, -1] = np.round(self.realm.fog_map)
+      fog_key = self.realm.fog_round_key
+      if fog_key is None or fog_key != self._fog_obs_key:
+        self.tile_map[:, :, -1] = np.round(self.realm.fog_map)
+        self._fog_obs_key = fog_key
 
     for agent_id in self._current_agents:
       if agent_id not in self.realm.players:
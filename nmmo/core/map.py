@@ -1,9 +1,12 @@
 from typing import List, Tuple
 import numpy as np
 from ordered_set import OrderedSet
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import breadth_first_order
 
-from nmmo.core.tile import Tile
+from nmmo.core.tile import Tile, TileState
 from nmmo.lib import material, utils
+from nmmo.lib.astar import AStar, PathfindingCache
 from nmmo.core.terrain import (
   fractal_to_material,
   process_map_border,
@@ -17,17 +20,35 @@ class Map:
 
   Also tracks a sparse list of tile updates
   '''
+  # Materials harvested from a neighbouring tile, see HarvestSkill.harvest_adjacent
+  ADJACENT_MATERIALS = (material.Water, material.Fish)
+  NEIGHBOURS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
   def __init__(self, config, realm, np_random):
     self.config = config
     self._repr  = None
+    self._packet = None
     self.realm  = realm
     self.update_list = None
-    self.pathfinding_cache = {} # Avoid recalculating A*, paths don't move
+    self.material_map = None  # material index of each tile, as loaded
+    # Avoid recalculating A*, paths don't change until the map does
+    self.pathfinding_cache = PathfindingCache(config.MAP_PATHFINDING_CACHE_SIZE)
+    self.pathfinder = AStar(config.MAP_SIZE)
+    # Next-step directions toward shared goals, see flow_field()
+    self.flow_fields = PathfindingCache(config.MAP_FLOW_FIELD_CACHE_SIZE)
+    self._habitable_graph = None
 
     sz          = config.MAP_SIZE
     self.tiles  = np.zeros((sz,sz), dtype=object)
     self.habitable_tiles = np.zeros((sz,sz), dtype=np.int8)
 
+    # For each adjacent material, the number of 4-neighbours of each tile currently
+    # in that material, and the tile states these counts were taken from
+    self.adjacent = {}
+    self._adjacent_state = np.zeros((sz,sz), dtype=np.int16)
+    self._tile_table = realm.datastore.table("Tile")
+    self._state_map = None
+
     for r in range(sz):
       for c in range(sz):
         self.tiles[r, c] = Tile(realm, r, c, np_random)
@@ -43,17 +64,27 @@ class Map:
 
   @property
   def packet(self):
-    '''Packet of degenerate resource states'''
-    missing_resources = []
-    for e in self.update_list:
-      missing_resources.append(e.pos)
-    return missing_resources
+    '''Packet of degenerate resource states: an (N, 2) array of tile positions'''
+    if self._packet is None:
+      self._packet = np.array([tile.pos for tile in self.update_list],
+                              dtype=np.int16).reshape(-1, 2)
+    return self._packet
+
+  @property
+  def state_map(self):
+    '''Material index of the current tile states, a view of the Tile table'''
+    # pylint: disable=protected-access
+    if self._state_map is None or self._state_map.base is not self._tile_table._data:
+      self._state_map = TileState.Query.get_map(self.realm.datastore, self.config.MAP_SIZE)[
+        :, :, TileState.State.attr_name_to_col["material_id"]]
+    return self._state_map
 
   @property
   def repr(self):
-    '''Flat matrix of tile material indices'''
-    if not self._repr:
-      self._repr = [[t.material.index for t in row] for row in self.tiles]
+    '''Matrix of tile material indices, shared until the map changes'''
+    if self._repr is None:
+      self._repr = self.material_map.view()
+      self._repr.flags.writeable = False
     return self._repr
 
   def reset(self, map_dict, np_random, seize_targets=None):
@@ -76,6 +107,8 @@ class Map:
       "MAP_BORDER must be greater than PLAYER_VISION_RADIUS"
 
     self._repr = None
+    self._packet = None
+    self._clear_paths()
     self.update_list = OrderedSet() # critical for determinism
     self.seize_targets = []
     if seize_targets:
@@ -101,6 +134,13 @@ class Map:
         tile = self.tiles[r, c]
         tile.reset(mat, config, np_random)
         self.habitable_tiles[r, c] = tile.habitable
+    self.material_map = np.array(matl_map, dtype=np.int16)
+    self._build_adjacency()
+
+    # Entities are sent to these goals by the minigames and NPC orders
+    if config.MAP_PRECOMPUTE_FLOW_FIELDS:
+      for goal in [self.center_coord, *self.quad_centers.values(), *self.seize_targets]:
+        self.flow_field(goal)
 
   def _process_map(self, map_dict, np_random):
     map_np_array = map_dict["map"]
@@ -130,21 +170,107 @@ class Map:
     map_np_array[row-dist:row+dist+1,col-dist:col+dist+1] = material.Grass.index
     map_np_array[row,col] = material.Herb.index
 
+  def _build_adjacency(self):
+    self._adjacent_state[:] = self.state_map
+    padded = np.pad(self._adjacent_state, 1, constant_values=-1)
+    for matl in self.ADJACENT_MATERIALS:
+      is_matl = (padded == matl.index).astype(np.int8)
+      self.adjacent[matl.index] = is_matl[:-2, 1:-1] + is_matl[2:, 1:-1] \
+                                  + is_matl[1:-1, :-2] + is_matl[1:-1, 2:]
+
+  def _sync_state(self, tile):
+    '''Update the adjacency grids after the tile was depleted or respawned'''
+    r, c = tile.pos
+    old, new = self._adjacent_state[r, c], tile.state.index
+    if old == new:
+      return
+    self._adjacent_state[r, c] = new
+    for idx, count in self.adjacent.items():
+      delta = int(new == idx) - int(old == idx)
+      if delta == 0:
+        continue
+      for dr, dc in self.NEIGHBOURS:
+        if self.is_valid_pos(r+dr, c+dc):
+          count[r+dr, c+dc] += delta
+
+  def _clear_paths(self):
+    '''Forget the paths computed on the previous habitability map'''
+    self.pathfinding_cache.clear()
+    self.pathfinder.clear()
+    self.flow_fields.clear()
+    self._habitable_graph = None
+
+  def flow_field(self, goal):
+    '''Direction of the first step of a shortest path to goal, from every tile
+
+    Returns a (MAP_SIZE, MAP_SIZE) int8 array of indices into NEIGHBOURS,
+    or -1 at the goal and where it is unreachable. One BFS over the habitable
+    tiles serves every entity heading to the same goal, until the map changes
+    or the goal drops out of the MAP_FLOW_FIELD_CACHE_SIZE most recent ones.
+    '''
+    goal = tuple(goal)
+    field = self.flow_fields.get(goal)
+    if field is not None:
+      return field
+
+    sz = self.config.MAP_SIZE
+    field = np.full((sz, sz), -1, dtype=np.int8)
+    if self.habitable_tiles[goal]:
+      if self._habitable_graph is None:
+        self._habitable_graph = self._build_habitable_graph()
+      goal_idx = goal[0]*sz + goal[1]
+      order, parent = breadth_first_order(self._habitable_graph, goal_idx,
+                                          directed=False, return_predecessors=True)
+      order = order[1:]  # the goal has no next step
+      # The BFS parent of a tile is one step closer to the goal
+      step = parent[order] - order
+      field.flat[order] = np.select([step == -sz, step == sz, step == -1], [0, 1, 2], 3)
+
+    self.flow_fields.put(goal, field)
+    return field
+
+  def flow_step(self, pos, goal):
+    '''(dr, dc) of the next step from pos toward goal, None if unreachable'''
+    if tuple(pos) == tuple(goal):
+      return (0, 0)
+    direction = self.flow_field(goal)[pos]
+    if direction < 0:
+      return None
+    return self.NEIGHBOURS[direction]
+
+  def _build_habitable_graph(self):
+    '''Sparse graph linking every pair of 4-adjacent habitable tiles'''
+    sz = self.config.MAP_SIZE
+    habitable = self.habitable_tiles.astype(bool)
+    idx = np.arange(sz*sz).reshape(sz, sz)
+    right = habitable[:, :-1] & habitable[:, 1:]
+    down = habitable[:-1, :] & habitable[1:, :]
+    src = np.concatenate([idx[:, :-1][right], idx[:-1, :][down]])
+    dst = np.concatenate([idx[:, 1:][right], idx[1:, :][down]])
+    return csr_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(sz*sz, sz*sz))
+
   def step(self):
     '''Evaluate updatable tiles'''
+    if self.update_list:
+      self._packet = None
     for tile in self.update_list.copy():
       if not tile.depleted:
         self.update_list.remove(tile)
       tile.step()
+      self._sync_state(tile)
     if self.seize_targets:
       for r, c in self.seize_targets:
         self.tiles[r, c].update_seize()
 
   def harvest(self, r, c, deplete=True):
     '''Called by actions that harvest a resource tile'''
+    tile = self.tiles[r, c]
     if deplete:
-      self.update_list.add(self.tiles[r, c])
-    return self.tiles[r, c].harvest(deplete)
+      self.update_list.add(tile)
+      self._packet = None
+    drop_table = tile.harvest(deplete)
+    self._sync_state(tile)
+    return drop_table
 
   def is_valid_pos(self, row, col):
     '''Check if a position is valid'''
@@ -164,6 +290,9 @@ class Map:
         # pylint: disable=protected-access
         tile.reset(material.Grass, self.config, self.realm._np_random)
         self.habitable_tiles[r, c] = tile.habitable  # must be true
+    self._clear_paths()
+    self.material_map[row-radius:row+radius+1, col-radius:col+radius+1] = material.Grass.index
+    self._build_adjacency()
 
   @property
   def seize_status(self):
@@ -0,0 +1,47 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+
+class MapCache:
+  '''Per-process LRU cache of map arrays loaded from .npy files
+
+  Cached arrays are read-only. With mmap, the file pages are shared by every
+  process that maps them, including workers forked after the first load.
+  Callers that modify a map in place must work on a copy.
+
+  Entries are keyed by the file path and checked against the file's inode,
+  mtime and size on every load, so regenerated maps are picked up.
+  '''
+  def __init__(self):
+    self._cache = OrderedDict()
+
+  def __len__(self):
+    return len(self._cache)
+
+  def load(self, path, max_size, mmap=False):
+    if max_size <= 0:
+      return np.load(path, mmap_mode='r' if mmap else None)
+
+    stat = os.stat(path)
+    version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    key = (os.path.abspath(path), mmap)
+
+    entry = self._cache.get(key)
+    if entry is None or entry[0] != version:
+      array = np.load(path, mmap_mode='r' if mmap else None)
+      array.flags.writeable = False
+      entry = (version, array)
+      self._cache[key] = entry
+
+    self._cache.move_to_end(key)
+    while len(self._cache) > max_size:
+      self._cache.popitem(last=False)
+
+    return entry[1]
+
+  def clear(self):
+    self._cache.clear()
+
+MAP_CACHE = MapCache()
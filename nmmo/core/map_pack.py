@@ -0,0 +1,72 @@
+'''Single-file map pack
+
+All maps and fractals for a config are stored as one structured .npy array of
+shape (MAP_N,), with one record per map. The file can be memory-mapped, so only
+the pages of the maps actually used are read from disk.
+'''
+import os
+
+import numpy as np
+
+
+def pack_dtype(map_size):
+  '''Record type of a map pack holding maps of map_size x map_size tiles'''
+  return np.dtype([('map', np.int16, (map_size, map_size)),
+                   ('fractal', np.float16, (map_size, map_size))])
+
+def pack_path(config, path_maps=None):
+  if path_maps is None:
+    path_maps = os.path.join(config.PATH_CWD, config.PATH_MAPS)
+  return os.path.join(path_maps, config.PATH_MAP_PACK)
+
+class PackWriter:
+  '''Writes the maps of a pack one at a time, in any order
+
+  The file is preallocated and memory-mapped, so the maps are not held in memory.
+  It is written to a temporary file, so that mapped readers never see a partial file'''
+  def __init__(self, path, map_n, map_size):
+    self.path = path
+    self._tmp_path = f'{path}.{os.getpid()}.tmp'
+    self._pack = np.lib.format.open_memmap(
+      self._tmp_path, mode='w+', dtype=pack_dtype(map_size), shape=(map_n,))
+
+  def write(self, idx, tiles, fractal):
+    self._pack['map'][idx] = tiles.astype(np.int16)
+    self._pack['fractal'][idx] = fractal
+
+  def close(self):
+    self._pack.flush()
+    self._pack = None  # unmap before the rename
+    os.replace(self._tmp_path, self.path)
+
+def save(path, maps, fractals):
+  '''Write the maps and fractals (sequences of 2D arrays) as a map pack'''
+  assert len(maps) == len(fractals), 'Each map needs a fractal'
+  writer = PackWriter(path, len(maps), maps[0].shape[0])
+  for idx, (tiles, fractal) in enumerate(zip(maps, fractals)):
+    writer.write(idx, tiles, fractal)
+  writer.close()
+
+def load(path, mmap=True):
+  return np.load(path, mmap_mode='r' if mmap else None)
+
+def is_valid(path, map_n, map_size):
+  '''Check that the pack exists and holds at least map_n maps of the right size'''
+  if not os.path.exists(path):
+    return False
+  pack = load(path)
+  return pack.dtype == pack_dtype(map_size) and len(pack) >= map_n
+
+def from_directory(config):
+  '''Convert maps saved in the one-directory-per-map layout into a map pack'''
+  path_maps = os.path.join(config.PATH_CWD, config.PATH_MAPS)
+  path = pack_path(config)
+  writer = None
+  for map_id in range(1, config.MAP_N+1):
+    tiles = np.load(os.path.join(path_maps, config.PATH_MAP_SUFFIX.format(map_id)))
+    fractal = np.load(os.path.join(path_maps, config.PATH_FRACTAL_SUFFIX.format(map_id)))
+    if writer is None:
+      writer = PackWriter(path, config.MAP_N, tiles.shape[0])
+    writer.write(map_id - 1, tiles, fractal)
+  writer.close()
+  return path
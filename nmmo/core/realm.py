@@ -6,11 +6,13 @@ import numpy as np
 import nmmo
 from nmmo.core.map import Map
 from nmmo.core.tile import TileState
-from nmmo.core.action import Action, Buy, Comm
+from nmmo.core.action import Action, Attack, Buy, Comm
 from nmmo.entity.entity import EntityState
 from nmmo.entity.entity_manager import PlayerManager
 from nmmo.entity.npc_manager import NPCManager
 from nmmo.datastore.numpy_datastore import NumpyDatastore
+from nmmo.datastore.serialized import StatePool
+from nmmo.systems import combat
 from nmmo.systems.exchange import Exchange
 from nmmo.systems.item import ItemState
 from nmmo.lib.event_log import EventLogger, EventState
@@ -44,7 +46,10 @@ class Realm:
 
     # Load the world file
     self.map = Map(config, self, self._np_random)
-    self.fog_map = np.zeros((config.MAP_SIZE, config.MAP_SIZE), dtype=np.float16)
+    self.fog_map = np.zeros((config.MAP_SIZE, config.MAP_SIZE), dtype=np.float32)
+    self.fog_round_key = (0, -1)  # changes whenever np.round(fog_map) may change
+    self._fog_base = None
+    self._fog_safe = None
 
     # Event logger
     self.event_log = EventLogger(self)
@@ -56,6 +61,9 @@ class Realm:
     # Global item registry
     self.items = {}
 
+    # Released entities and items to reuse, see config.POOL_OBJECTS
+    self.pool = StatePool() if config.POOL_OBJECTS else None
+
     # Global item exchange
     self.exchange = Exchange(self)
 
@@ -93,6 +101,8 @@ class Realm:
     # DataStore id allocator must be reset to be deterministic
     EntityState.State.table(self.datastore).reset()
     ItemState.State.table(self.datastore).reset()
+    if self.pool is not None:
+      self.pool.recycle()
 
     self.event_log.reset()  # reset this last for debugging
 
@@ -172,6 +182,11 @@ class Realm:
       if priority == Buy.priority:
         self._np_random.shuffle(merged[priority])
 
+      if priority == Attack.priority and self.config.COMBAT_SYSTEM_ENABLED and \
+         self.config.COMBAT_BATCH_ATTACKS:
+        combat.resolve_attacks(self, merged[priority])
+        continue
+
       # CHECK ME: do we need this line?
       # ent_id, (atn, args) = merged[priority][0]
       for ent_id, (atn, args) in merged[priority]:
@@ -191,6 +206,8 @@ class Realm:
     self.event_log.update()
     if self._replay_helper is not None:
       self._replay_helper.update()
+    if self.pool is not None:
+      self.pool.recycle()  # the items destroyed during this tick
 
     return dead_players, dead_npcs
 
@@ -200,26 +217,39 @@ class Realm:
       return
 
     fog_speed = self.config.DEATH_FOG_SPEED
-    center = self.config.MAP_SIZE // 2
+    size = self.config.MAP_SIZE
+    center = size // 2
     safe = self.config.DEATH_FOG_FINAL_SIZE
 
-    if reset:
-      dist = -self.config.MAP_BORDER
-      for i in range(center):
-        l, r = i, self.config.MAP_SIZE - i
-        # positive value represents the poison strength
-        # negative value represents the shortest distance to poison area
-        self.fog_map[l:r, l:r] = -dist
-        dist += 1
+    if reset or self._fog_base is None:
+      # positive value represents the poison strength
+      # negative value represents the shortest distance to poison area
+      # The fog starts at the map border, and moves in by one per tile from the edge
+      edge_dist = np.minimum(np.arange(size), np.arange(size)[::-1])
+      ring = np.minimum.outer(edge_dist, edge_dist)
+      self._fog_base = (self.config.MAP_BORDER - np.minimum(ring, center-1)).astype(np.float32)
       # mark the safe area
-      self.fog_map[center-safe:center+safe+1, center-safe:center+safe+1] = -self.config.MAP_SIZE
-      return
+      self._fog_safe = np.zeros((size, size), dtype=bool)
+      self._fog_safe[center-safe:center+safe+1, center-safe:center+safe+1] = True
+      self._fog_base[self._fog_safe] = -size
+      self.fog_map[:] = self._fog_base
+      self.fog_round_key = (0, -1)
+      if reset:
+        return
 
     # consider the map border so that the fog can hit the border at fog_start_tick
     if self.tick >= fog_start_tick:
-      self.fog_map += fog_speed
-      # mark the safe area
-      self.fog_map[center-safe:center+safe+1, center-safe:center+safe+1] = -self.config.MAP_SIZE
+      # The fog is computed from the number of ticks since the onset, rather than
+      # accumulated, so it does not drift with rounding errors
+      offset = fog_speed * (self.tick - max(fog_start_tick, 1) + 1)
+      np.add(self._fog_base, offset, out=self.fog_map)
+      self.fog_map[self._fog_safe] = -size
+
+      # The base fog is integer, so np.round(fog_map) only changes when the rounding of
+      # the offset does. Near .5, float32 errors and round-half-to-even can go either way
+      frac = offset - np.floor(offset)
+      self.fog_round_key = None if abs(frac - 0.5) < 1e-3 \
+        else (int(np.floor(offset)), int(frac > 0.5))
 
   def record_replay(self, replay_helper: ReplayHelper) -> ReplayHelper:
     self._replay_helper = replay_helper
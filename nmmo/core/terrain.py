@@ -1,10 +1,18 @@
 import os
+import json
+import time
+import shutil
+import hashlib
 import logging
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import numpy as np
 from imageio.v2 import imread, imsave
 from scipy import stats
 
+from nmmo.core import map_pack
 from nmmo.lib import material, seeding, utils, vec_noise
 
 
@@ -15,23 +23,44 @@ def sharp(noise):
 class Save:
   '''Save utility for map files'''
   @staticmethod
-  def render(mats, lookup, path):
-    '''Render tiles to png'''
-    images = [[lookup[e] for e in l] for l in mats]
-    image = np.vstack([np.hstack(e) for e in images])
-    imsave(path, image)
+  def npy(path, array):
+    '''Write .npy via a temporary file, so that readers (incl. memory-mapped
+    ones) never see a partially written or truncated file'''
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+      np.save(f, array)
+    os.replace(tmp_path, path)
+
+  @staticmethod
+  def render(mats, atlas, path):
+    '''Render tiles to png. The atlas is a (material, height, width, rgb) array
+    of textures, or a dict of material index to texture'''
+    if isinstance(atlas, dict):
+      atlas = texture_atlas(atlas)
+    mats = np.asarray(mats).astype(int)
+    rows, cols = mats.shape
+    _, height, width, channels = atlas.shape
+    image = atlas[mats].transpose(0, 2, 1, 3, 4)
+    imsave(path, image.reshape(rows*height, cols*width, channels))
 
   @staticmethod
   def fractal(terrain, path):
     '''Save fractal to both png and npy'''
     imsave(os.path.join(path, 'fractal.png'), (256*terrain).astype(np.uint8))
-    np.save(os.path.join(path, 'fractal.npy'), terrain.astype(np.float16))
+    Save.npy(os.path.join(path, 'fractal.npy'), terrain.astype(np.float16))
 
   @staticmethod
   def as_numpy(mats, path):
     '''Save map to .npy'''
     path = os.path.join(path, 'map.npy')
-    np.save(path, mats.astype(int))
+    Save.npy(path, mats.astype(int))
+
+def texture_atlas(textures):
+  '''Stacks a dict of material index to texture into an array indexed by material'''
+  atlas = np.zeros((max(textures) + 1, *next(iter(textures.values())).shape), dtype=np.uint8)
+  for idx, tex in textures.items():
+    atlas[idx] = tex
+  return atlas
 
 # pylint: disable=E1101:no-member
 # Terrain uses setattr()
@@ -40,10 +69,7 @@ class Terrain:
   @staticmethod
   def generate_terrain(config, map_id, interpolaters):
     center      = config.MAP_CENTER
-    border      = config.MAP_BORDER
     size        = config.MAP_SIZE
-    frequency   = config.TERRAIN_FREQUENCY
-    offset      = config.TERRAIN_FREQUENCY_OFFSET
     octaves     = center // config.TERRAIN_TILES_PER_OCTAVE
 
     #Compute a unique seed based on map index
@@ -59,52 +85,27 @@ class Terrain:
 
     interpolate = interpolaters[map_id]
 
-    #Data buffers
-    val   = np.zeros((size, size, octaves))
-    scale = np.zeros((size, size, octaves))
-    s     = np.arange(size)
-    X, Y  = np.meshgrid(s, s)
-
-    #Compute noise over logscaled octaves
-    start = frequency
-    end   = min(start, start - np.log2(center) + offset)
-    for idx, freq in enumerate(np.logspace(start, end, octaves, base=2)):
-      val[:, :, idx] = vec_noise.snoise2(seed*size + freq*X, idx*size + freq*Y)
-
-    #Compute L1 distance
-    l1     = utils.l1_map(size)
-
     #Interpolation Weights
     rrange = np.linspace(-1, 1, 2*octaves-1)
     pdf    = stats.norm.pdf(rrange, 0, interpolate)
     pdf    = pdf / max(pdf)
-    high   = center / 2
-    delta  = high / octaves
 
-    #Compute perlin mask
-    noise  = np.zeros((size, size))
-    X, Y   = np.meshgrid(s, s)
-    expand = int(np.log2(center)) - 2
-    for idx, octave in enumerate(range(expand, 1, -1)):
-      freq, mag = 1 / 2**octave, 1 / 2**idx
-      noise    += mag * vec_noise.snoise2(seed*size + freq*X, idx*size + freq*Y)
+    if config.TERRAIN_CHUNK_ROWS:
+      val, matl = _generate_terrain_tiled(config, seed, pdf)
+      return val, matl, interpolaters
+
+    val, noise = _noise_layers(config, seed)
 
-    noise -= np.min(noise)
+    #Compute L1 distance
+    l1     = utils.l1_map(size)
+
+    #Compute perlin mask
+    noise = noise - np.min(noise)
     noise = octaves * noise / np.max(noise) - 1e-12
     noise = noise.astype(int)
 
     #Compute L1 and Perlin scale factor
-    for i in range(octaves):
-      start             = octaves - i - 1
-      scale[l1 <= high] = np.arange(start, start + octaves)
-      high             -= delta
-
-    start   = noise - 1
-    l1_scale = np.clip(l1, 0, size//2 - border - 2)
-    l1_scale = l1_scale / np.max(l1_scale)
-    for i in range(octaves):
-      idxs           = l1_scale*scale[:, :, i] + (1-l1_scale)*(start + i)
-      scale[:, :, i] = pdf[idxs.astype(int)]
+    scale = _octave_scale(config, l1, noise, pdf)
 
     #Blend octaves
     std = np.std(val)
@@ -120,26 +121,164 @@ class Terrain:
 
     return val, matl, interpolaters
 
+def _octave_scale(config, l1, noise, pdf):
+  '''Per-octave weights of the tiles with the given L1 distance and perlin mask.
+  Works on any part of the map, since both are normalized over the whole map'''
+  center  = config.MAP_CENTER
+  border  = config.MAP_BORDER
+  size    = config.MAP_SIZE
+  octaves = center // config.TERRAIN_TILES_PER_OCTAVE
+  high    = center / 2
+  delta   = high / octaves
+
+  scale = np.zeros((*l1.shape, octaves))
+  for i in range(octaves):
+    start             = octaves - i - 1
+    scale[l1 <= high] = np.arange(start, start + octaves)
+    high             -= delta
+
+  # The largest l1 is size//2, at the map edges
+  start    = noise - 1
+  l1_scale = np.clip(l1, 0, size//2 - border - 2)
+  l1_scale = l1_scale / np.clip(size//2, 0, size//2 - border - 2)
+  for i in range(octaves):
+    idxs           = l1_scale*scale[:, :, i] + (1-l1_scale)*(start + i)
+    scale[:, :, i] = pdf[idxs.astype(int)]
+  return scale
+
+def _merge_stats(acc, chunk):
+  '''Merges the count, mean and sum of squared deviations of chunk into acc'''
+  count, mean, m2 = acc
+  chunk_count = chunk.size
+  chunk_mean = np.mean(chunk, dtype=np.float64)
+  chunk_m2 = np.sum(np.square(chunk - chunk_mean, dtype=np.float64))
+  total = count + chunk_count
+  delta = chunk_mean - mean
+  return (total, mean + delta * chunk_count / total,
+          m2 + chunk_m2 + delta**2 * count * chunk_count / total)
+
+def _generate_terrain_tiled(config, seed, pdf):
+  '''Same as the blending in Terrain.generate_terrain, but computed TERRAIN_CHUNK_ROWS rows
+  at a time. Noise is evaluated at global coordinates and all normalizations use whole-map
+  statistics, so there are no seams between chunks. The fractal and materials are written
+  to memory-mapped temporary files (in TMPDIR), so memory use does not grow with the map.
+
+  The result matches the full computation up to floating point rounding.'''
+  size        = config.MAP_SIZE
+  center      = config.MAP_CENTER
+  frequency   = config.TERRAIN_FREQUENCY
+  offset      = config.TERRAIN_FREQUENCY_OFFSET
+  octaves     = center // config.TERRAIN_TILES_PER_OCTAVE
+  dtype       = np.float32 if config.TERRAIN_NOISE_FLOAT32 else np.float64
+  noise_args  = {'dtype': dtype, 'chunk_size': config.TERRAIN_NOISE_CHUNK_SIZE}
+  chunks      = [(r, min(r + config.TERRAIN_CHUNK_ROWS, size))
+                 for r in range(0, size, config.TERRAIN_CHUNK_ROWS)]
+  s           = np.arange(size)
+  freqs       = np.logspace(frequency, min(frequency, frequency - np.log2(center) + offset),
+                            octaves, base=2)
+  expand      = int(np.log2(center)) - 2
+
+  val  = np.memmap(tempfile.TemporaryFile(), dtype=np.float64, mode='w+', shape=(size, size))
+  matl = np.memmap(tempfile.TemporaryFile(), dtype=np.int16, mode='w+', shape=(size, size))
+
+  #Perlin mask noise, kept in val until its min/max are known
+  for r0, r1 in chunks:
+    X, Y  = np.meshgrid(s, s[r0:r1])
+    noise = np.zeros(X.shape, dtype=dtype)
+    for idx, octave in enumerate(range(expand, 1, -1)):
+      freq, mag = 1 / 2**octave, 1 / 2**idx
+      noise    += mag * vec_noise.snoise2(seed*size + freq*X, idx*size + freq*Y, **noise_args)
+    val[r0:r1] = noise
+  noise_min = np.min(val)
+  noise_range = np.max(val) - noise_min
+
+  #Blend octaves. With std the std of the noise, generate_terrain computes
+  #std * blend / np.std(blend), where blend = sum(scale**2 * noise) / std,
+  #which is the same as std * blend' / np.std(blend') without dividing by std
+  noise_stats = blend_stats = (0, 0., 0.)
+  for r0, r1 in chunks:
+    X, Y = np.meshgrid(s, s[r0:r1])
+    raw  = np.zeros((*X.shape, octaves), dtype=dtype)
+    for idx, freq in enumerate(freqs):
+      raw[:, :, idx] = vec_noise.snoise2(seed*size + freq*X, idx*size + freq*Y, **noise_args)
+    noise_stats = _merge_stats(noise_stats, raw)
+
+    noise = octaves * (val[r0:r1] - noise_min) / noise_range - 1e-12
+    l1    = np.maximum(np.abs(X - size//2), np.abs(Y - size//2))
+    scale = _octave_scale(config, l1, noise.astype(int), pdf)
+    val[r0:r1] = np.sum(scale * (scale * raw), -1)
+    blend_stats = _merge_stats(blend_stats, val[r0:r1])
+
+  std = np.sqrt(noise_stats[2] / noise_stats[0])
+  blend_std = np.sqrt(blend_stats[2] / blend_stats[0])
+
+  # Transform fractal noise to terrain
+  for r0, r1 in chunks:
+    X, Y  = np.meshgrid(s, s[r0:r1])
+    chunk = std * val[r0:r1] / blend_std
+    chunk = 0.5 + np.clip(chunk, -1, 1)/2
+    val[r0:r1] = chunk
+    l1 = np.maximum(np.abs(X - size//2), np.abs(Y - size//2))
+    matl[r0:r1] = process_map_border(config, fractal_to_material(config, chunk), l1)
+
+  return val, matl
+
+_NOISE_CACHE = OrderedDict()
+
+def _noise_layers(config, seed):
+  '''Multi-octave noise and the perlin mask noise of a map. These depend only on the seed
+  and the map size/frequency settings, not on the interpolation, so they are memoized'''
+  size        = config.MAP_SIZE
+  center      = config.MAP_CENTER
+  frequency   = config.TERRAIN_FREQUENCY
+  offset      = config.TERRAIN_FREQUENCY_OFFSET
+  octaves     = center // config.TERRAIN_TILES_PER_OCTAVE
+  dtype       = np.float32 if config.TERRAIN_NOISE_FLOAT32 else np.float64
+  noise_args  = {'dtype': dtype, 'chunk_size': config.TERRAIN_NOISE_CHUNK_SIZE}
+
+  key = (seed, size, center, frequency, offset, octaves, dtype)
+  if key in _NOISE_CACHE:
+    _NOISE_CACHE.move_to_end(key)
+    return _NOISE_CACHE[key]
+
+  val   = np.zeros((size, size, octaves), dtype=dtype)
+  s     = np.arange(size)
+  X, Y  = np.meshgrid(s, s)
+
+  #Compute noise over logscaled octaves
+  start = frequency
+  end   = min(start, start - np.log2(center) + offset)
+  for idx, freq in enumerate(np.logspace(start, end, octaves, base=2)):
+    val[:, :, idx] = vec_noise.snoise2(seed*size + freq*X, idx*size + freq*Y, **noise_args)
+
+  #Perlin mask noise
+  noise  = np.zeros((size, size), dtype=dtype)
+  expand = int(np.log2(center)) - 2
+  for idx, octave in enumerate(range(expand, 1, -1)):
+    freq, mag = 1 / 2**octave, 1 / 2**idx
+    noise    += mag * vec_noise.snoise2(seed*size + freq*X, idx*size + freq*Y, **noise_args)
+
+  max_bytes = config.TERRAIN_NOISE_CACHE_MB * 2**20
+  if val.nbytes + noise.nbytes <= max_bytes:
+    val.flags.writeable = False
+    noise.flags.writeable = False
+    _NOISE_CACHE[key] = (val, noise)
+    while sum(v.nbytes + n.nbytes for v, n in _NOISE_CACHE.values()) > max_bytes:
+      _NOISE_CACHE.popitem(last=False)
+
+  return val, noise
+
 def fractal_to_material(config, fractal, all_grass=False):
   size = config.MAP_SIZE
-  matl_map = np.zeros((size, size), dtype=np.int16)
-  for y in range(size):
-    for x in range(size):
-      if all_grass:
-        matl_map[y, x] = Terrain.GRASS
-        continue
-
-      v = fractal[y, x]
-      if v <= config.TERRAIN_WATER:
-        mat = Terrain.WATER
-      elif v <= config.TERRAIN_GRASS:
-        mat = Terrain.GRASS
-      elif v <= config.TERRAIN_FOILAGE:
-        mat = Terrain.FOILAGE
-      else:
-        mat = Terrain.STONE
-      matl_map[y, x] = mat
-  return matl_map
+  if all_grass:
+    return np.full((size, size), Terrain.GRASS, dtype=np.int16)
+
+  fractal = fractal[:size, :size]
+  return np.select([fractal <= config.TERRAIN_WATER,
+                    fractal <= config.TERRAIN_GRASS,
+                    fractal <= config.TERRAIN_FOILAGE],
+                   [Terrain.WATER, Terrain.GRASS, Terrain.FOILAGE],
+                   Terrain.STONE).astype(np.int16)
 
 def process_map_border(config, matl_map, l1=None):
   size = config.MAP_SIZE
@@ -156,61 +295,79 @@ def process_map_border(config, matl_map, l1=None):
   return matl_map
 
 def place_fish(tiles, mmin, mmax, np_random, num_fish):
-  placed = 0
-
   # if USE_CYTHON:
   #   water_loc = chp.tile_where(tiles, Terrain.WATER, mmin, mmax)
   # else:
-  water_loc = np.where(tiles == Terrain.WATER)
-  water_loc = [(r, c) for r, c in zip(water_loc[0], water_loc[1])
-              if mmin < r < mmax and mmin < c < mmax]
-  if len(water_loc) < num_fish:
+  rows, cols = np.where(tiles == Terrain.WATER)
+  inside = (mmin < rows) & (rows < mmax) & (mmin < cols) & (cols < mmax)
+  rows, cols = rows[inside], cols[inside]
+  if len(rows) < num_fish:
     raise RuntimeError('Not enough water tiles to place fish.')
 
-  np_random.shuffle(water_loc)
+  # Shuffling the indices consumes the same random numbers as shuffling the locations
+  order = np.arange(len(rows))
+  np_random.shuffle(order)
+  rows, cols = rows[order], cols[order]
 
-  allow = {Terrain.GRASS}  # Fish should be placed adjacent to grass
-  for r, c in water_loc:
-    if tiles[r-1, c] in allow or tiles[r+1, c] in allow or \
-       tiles[r, c-1] in allow or tiles[r, c+1] in allow:
-      tiles[r, c] = Terrain.FISH
-      placed += 1
-    if placed == num_fish:
-      break
+  # Fish should be placed adjacent to grass. Placing fish does not change the grass,
+  # so the first num_fish water tiles next to grass are the ones that get fish
+  grass = tiles == Terrain.GRASS
+  adjacent = grass[rows-1, cols] | grass[rows+1, cols] | \
+             grass[rows, cols-1] | grass[rows, cols+1]
+  fish = np.flatnonzero(adjacent)[:num_fish]
+  tiles[rows[fish], cols[fish]] = Terrain.FISH
 
-  if placed < num_fish:
+  if len(fish) < num_fish:
     raise RuntimeError('Could not find the water tile to place fish.')
 
-def uniform(config, tiles, mat, mmin, mmax, np_random):
-  r = np_random.integers(mmin, mmax)
-  c = np_random.integers(mmin, mmax)
-
-  if tiles[r, c] not in {Terrain.GRASS}:
-    uniform(config, tiles, mat, mmin, mmax, np_random)
-  else:
-    tiles[r, c] = mat
+def _draw_positions(np_random, mmin, mmax, needed, is_valid):
+  '''Draws (r, c) pairs in [mmin, mmax) in batches, and returns the first needed
+  ones that pass is_valid(positions) along with their index in the draw sequence.
+
+  Only the numbers up to the last returned position are consumed from np_random,
+  so the generator ends up in the same state as when drawing pairs one at a time.'''
+  state = np_random.bit_generator.state
+  batch = 2*needed + 16
+  pos = np_random.integers(mmin, mmax, size=(batch, 2))
+  valid = np.flatnonzero(is_valid(pos))[:needed]
+  if len(valid) == needed and valid[-1] + 1 < batch:
+    np_random.bit_generator.state = state
+    np_random.integers(mmin, mmax, size=(valid[-1] + 1, 2))
+  return pos[valid]
+
+def _on_grass(tiles):
+  '''Valid positions are grass tiles, counting repeated positions only once,
+  because the first placement turns the grass into another material'''
+  def is_valid(pos):
+    first = np.zeros(len(pos), dtype=bool)
+    first[np.unique(pos[:, 0]*tiles.shape[1] + pos[:, 1], return_index=True)[1]] = True
+    return first & (tiles[pos[:, 0], pos[:, 1]] == Terrain.GRASS)
+  return is_valid
+
+def place_on_grass(tiles, mats, mmin, mmax, np_random):
+  '''Places each of mats on a random grass tile in order. Same as calling uniform()
+  for each material, but drawing the candidate tiles in batches'''
+  placed = 0
+  while placed < len(mats):
+    pos = _draw_positions(np_random, mmin, mmax, len(mats) - placed, _on_grass(tiles))
+    tiles[pos[:, 0], pos[:, 1]] = mats[placed:placed+len(pos)]
+    placed += len(pos)
 
-def cluster(config, tiles, mat, mmin, mmax, np_random):
-  mmin = mmin + 1
-  mmax = mmax - 1
+def uniform(_config, tiles, mat, mmin, mmax, np_random):
+  place_on_grass(tiles, [mat], mmin, mmax, np_random)
 
-  r = np_random.integers(mmin, mmax)
-  c = np_random.integers(mmin, mmax)
+def cluster(_config, tiles, mat, mmin, mmax, np_random):
+  def is_grass(pos):
+    return tiles[pos[:, 0], pos[:, 1]] == Terrain.GRASS
 
-  matls = {Terrain.GRASS}
-  if tiles[r, c] not in matls:
-    cluster(config, tiles, mat, mmin-1, mmax+1, np_random)
-    return
+  pos = _draw_positions(np_random, mmin + 1, mmax - 1, 1, is_grass)
+  while len(pos) == 0:
+    pos = _draw_positions(np_random, mmin + 1, mmax - 1, 1, is_grass)
 
+  r, c = pos[0]
   tiles[r, c] = mat
-  if tiles[r-1, c] in matls:
-    tiles[r-1, c] = mat
-  if tiles[r+1, c] in matls:
-    tiles[r+1, c] = mat
-  if tiles[r, c-1] in matls:
-    tiles[r, c-1] = mat
-  if tiles[r, c+1] in matls:
-    tiles[r, c+1] = mat
+  neighbors = np.array([(r-1, c), (r+1, c), (r, c-1), (r, c+1)])
+  tiles[tuple(neighbors[is_grass(neighbors)].T)] = mat
 
 def spawn_profession_resources(config, tiles, np_random=None):
   if np_random is None:
@@ -224,17 +381,11 @@ def spawn_profession_resources(config, tiles, np_random=None):
     cluster(config, tiles, Terrain.TREE, mmin, mmax, np_random)
     cluster(config, tiles, Terrain.CRYSTAL, mmin, mmax, np_random)
 
-  for _ in range(config.PROGRESSION_SPAWN_UNIFORMS):
-    uniform(config, tiles, Terrain.HERB, mmin, mmax, np_random)
+  place_on_grass(tiles, [Terrain.HERB] * config.PROGRESSION_SPAWN_UNIFORMS,
+                 mmin, mmax, np_random)
   place_fish(tiles, mmin, mmax, np_random,
              config.PROGRESSION_SPAWN_UNIFORMS)
 
-def try_add_tile(map_tiles, row, col, tile_to_add):
-  if map_tiles[row, col] == Terrain.GRASS:
-    map_tiles[row, col] = tile_to_add
-    return True
-  return False
-
 def scatter_extra_resources(config, tiles, np_random=None,
                             density_factor=6):
   if np_random is None:
@@ -243,17 +394,67 @@ def scatter_extra_resources(config, tiles, np_random=None,
   mmin = config.MAP_BORDER + 1
   mmax = config.MAP_SIZE - config.MAP_BORDER - 1
 
-  water_to_add, water_added = (center//density_factor)**2, 0
-  food_to_add, food_added  = (center//density_factor)**2, 0
-  while True:
-    if water_added >= water_to_add and food_added >= food_to_add:
-      break
-    r, c = tuple(np_random.integers(mmin, mmax, size=(2,)))
-    if water_added < water_to_add:
-      water_added += 1 if try_add_tile(tiles, r, c, Terrain.WATER) else 0
-    if food_added < food_to_add:
-      food_added += 1 if try_add_tile(tiles, r, c, Terrain.FOILAGE) else 0
-
+  # Each random grass tile gets water until enough water is added, then food
+  water_to_add = (center//density_factor)**2
+  food_to_add = (center//density_factor)**2
+  place_on_grass(tiles, [Terrain.WATER] * water_to_add + [Terrain.FOILAGE] * food_to_add,
+                 mmin, mmax, np_random)
+
+
+# Config attributes that change the maps of MapGenerator and how they are stored. Other
+# settings, e.g., caches, workers, previews, and the changes made on reset, do not change
+# the key. Add new terrain knobs here, or the maps cached before they changed are reused.
+MAP_KEY_ATTRS = [
+  'MAP_BORDER', 'MAP_CENTER', 'MAP_N', 'MAP_PACK', 'MAP_SIZE',
+  'PROFESSION_SYSTEM_ENABLED', 'PROGRESSION_SPAWN_CLUSTERS', 'PROGRESSION_SPAWN_UNIFORMS',
+  'TERRAIN_SYSTEM_ENABLED', 'TERRAIN_FLIP_SEED', 'TERRAIN_FOILAGE', 'TERRAIN_FREQUENCY',
+  'TERRAIN_FREQUENCY_OFFSET', 'TERRAIN_GRASS', 'TERRAIN_LOG_INTERPOLATE_MAX',
+  'TERRAIN_LOG_INTERPOLATE_MIN', 'TERRAIN_NOISE_FLOAT32', 'TERRAIN_TILES_PER_OCTAVE',
+  'TERRAIN_WATER',
+]
+
+# Bumped whenever the same seed and config generate different maps, e.g. version 2
+# gives each map its own random stream, so that older maps are not reused
+MAP_GENERATION_VERSION = 2
+MAP_VERSION_FILE = 'generation_version'
+
+def _is_current_version(path_maps):
+  '''True if the maps in path_maps were generated by MAP_GENERATION_VERSION'''
+  try:
+    with open(os.path.join(path_maps, MAP_VERSION_FILE), encoding='utf8') as f:
+      return f.read().strip() == str(MAP_GENERATION_VERSION)
+  except OSError:
+    return False
+
+def map_generation_key(config, seed=None):
+  '''Hash of the seed and the config attributes that affect map generation'''
+  inputs = {'seed': seed, 'version': MAP_GENERATION_VERSION}
+  gen_cls = config.MAP_GENERATOR
+  # Generators that do not derive from MapGenerator are keyed by the default inputs
+  key_attrs = gen_cls.key_attrs() if hasattr(gen_cls, 'key_attrs') else MAP_KEY_ATTRS
+  for attr in key_attrs:
+    inputs[attr] = getattr(config, attr, None)  # not all configs have all game systems
+  inputs['MAP_GENERATOR'] = f'{gen_cls.__module__}.{gen_cls.__qualname__}'
+  inputs_str = json.dumps(inputs, sort_keys=True, default=str)
+  return hashlib.sha256(inputs_str.encode('utf8')).hexdigest()[:16]
+
+def map_directory(config, seed=None):
+  '''Directory holding the maps of the config. With MAP_CONTENT_ADDRESSED,
+  this is a subdirectory of PATH_MAPS named by map_generation_key()'''
+  path_maps = os.path.join(config.PATH_CWD, config.PATH_MAPS)
+  if config.MAP_CONTENT_ADDRESSED:
+    path_maps = os.path.join(path_maps, map_generation_key(config, seed))
+  return path_maps
+
+_WORKER_MAP_GENERATOR = None
+
+def _init_map_worker(map_generator):
+  global _WORKER_MAP_GENERATOR # pylint: disable=global-statement
+  _WORKER_MAP_GENERATOR = map_generator
+
+def _generate_map_in_worker(idx, seed):
+  np_random = seeding.child_np_random(seed, idx)
+  return (idx, *_WORKER_MAP_GENERATOR.generate_map(idx, np_random))
 
 class MapGenerator:
   '''Procedural map generation'''
@@ -262,6 +463,14 @@ class MapGenerator:
     self.load_textures()
     self.interpolaters = None
 
+  @classmethod
+  def key_attrs(cls):
+    '''Config attributes that change the generated maps, see map_generation_key()
+
+    Subclasses that read other config attributes must add them, otherwise the
+    maps cached with MAP_CONTENT_ADDRESSED are reused when those change'''
+    return MAP_KEY_ATTRS
+
   def load_textures(self):
     '''Called during setup; loads and resizes tile pngs'''
     lookup = {}
@@ -273,6 +482,10 @@ class MapGenerator:
       lookup[mat.index] = tex[:, :, :3][::scale, ::scale]
       setattr(Terrain, key.upper(), mat.index)
     self.textures = lookup
+    self.texture_atlas = texture_atlas(lookup)
+
+    # One pixel per tile, with the mean color of the texture
+    self.texture_colors = self.texture_atlas.mean(axis=(1, 2), keepdims=True).astype(np.uint8)
 
   def generate_all_maps(self, seed=None):
     '''Generates MAP_N maps according to generate_map
@@ -280,37 +493,93 @@ class MapGenerator:
     Provides additional utilities for saving to .npy and rendering png previews'''
 
     config = self.config
-    np_random, _ = seeding.np_random(seed)
+    path_maps = map_directory(config, seed)
 
     #Only generate if maps are not cached
-    path_maps = os.path.join(config.PATH_CWD, config.PATH_MAPS)
-    os.makedirs(path_maps, exist_ok=True)
-
-    existing_maps = set(map_dir + '/map.npy' for map_dir in os.listdir(path_maps))
-    if not config.MAP_FORCE_GENERATION and existing_maps:
-      required_maps = {
-        f'map{idx}/map.npy' for idx in range(1, config.MAP_N+1)
-      }
-      missing = required_maps - existing_maps
-      if not missing:
+    if config.MAP_CONTENT_ADDRESSED:
+      # The directory is named by the generation inputs, and is only created once complete
+      if os.path.isdir(path_maps):
         return
+      out_dir = f'{path_maps}.{os.getpid()}.tmp'
+      shutil.rmtree(out_dir, ignore_errors=True)
+      os.makedirs(out_dir)
+    else:
+      out_dir = path_maps
+      os.makedirs(path_maps, exist_ok=True)
+      # Maps of an older generation scheme differ for the same seed
+      reuse = not config.MAP_FORCE_GENERATION and _is_current_version(path_maps)
+      if config.MAP_PACK:
+        if reuse and \
+            map_pack.is_valid(map_pack.pack_path(config, path_maps), config.MAP_N, config.MAP_SIZE):
+          return
+      else:
+        existing_maps = set(map_dir + '/map.npy' for map_dir in os.listdir(path_maps))
+        if reuse and existing_maps:
+          required_maps = {
+            f'map{idx}/map.npy' for idx in range(1, config.MAP_N+1)
+          }
+          missing = required_maps - existing_maps
+          if not missing:
+            return
 
     if __debug__:
       logging.info('Generating %s maps', str(config.MAP_N))
 
-    for idx in range(config.MAP_N):
-      path = path_maps + '/map' + str(idx+1)
-      os.makedirs(path, exist_ok=True)
-
-      terrain, tiles = self.generate_map(idx, np_random)
+    # Each map has its own random stream, so the results do not depend on
+    # the generation order or the number of workers
+    start = time.time()
+    pack_writer = None
+    if config.MAP_PACK:  # each map is written as it is generated
+      pack_writer = map_pack.PackWriter(map_pack.pack_path(config, out_dir),
+                                        config.MAP_N, config.MAP_SIZE)
+    for num_done, (idx, terrain, tiles) in enumerate(self._generate_maps(seed), start=1):
+      path = out_dir + '/map' + str(idx+1)
 
       #Save/render
-      Save.as_numpy(tiles, path)
-      Save.fractal(terrain, path)
+      if pack_writer is not None:
+        pack_writer.write(idx, tiles, terrain)
+      else:
+        os.makedirs(path, exist_ok=True)
+        Save.as_numpy(tiles, path)
+        Save.fractal(terrain, path)
       if config.MAP_GENERATE_PREVIEWS:
+        os.makedirs(path, exist_ok=True)
         b = config.MAP_BORDER
-        tiles = [e[b:-b+1] for e in tiles][b:-b+1]
-        Save.render(tiles, self.textures, path+'/map.png')
+        atlas = self.texture_colors if config.MAP_PREVIEW_FAST else self.texture_atlas
+        Save.render(tiles[b:-b+1, b:-b+1], atlas, path+'/map.png')
+
+      if __debug__:
+        logging.info('Generated %d/%d maps (%.1fs)', num_done, config.MAP_N, time.time()-start)
+
+    if pack_writer is not None:
+      pack_writer.close()
+    with open(os.path.join(out_dir, MAP_VERSION_FILE), 'w', encoding='utf8') as f:
+      f.write(str(MAP_GENERATION_VERSION))
+
+    if config.MAP_CONTENT_ADDRESSED:
+      try:
+        os.rename(out_dir, path_maps)
+      except OSError:  # the same maps were generated concurrently by another process
+        shutil.rmtree(out_dir)
+
+  def _generate_maps(self, seed):
+    '''Yields (idx, terrain, tiles) for all maps, in completion order'''
+    if seed is None:  # all workers must use the same entropy
+      seed = np.random.SeedSequence().entropy
+    num_maps = self.config.MAP_N
+    num_workers = min(self.config.MAP_GENERATION_WORKERS, num_maps)
+    if num_workers <= 1:
+      for idx in range(num_maps):
+        yield (idx, *self.generate_map(idx, seeding.child_np_random(seed, idx)))
+      return
+
+    # The generator is passed via the initializer, which is not pickled when forking
+    with ProcessPoolExecutor(num_workers, initializer=_init_map_worker,
+                             initargs=(self,)) as pool:
+      futures = [pool.submit(_generate_map_in_worker, idx, seed)
+                 for idx in range(num_maps)]
+      for future in as_completed(futures):
+        yield future.result()
 
   def generate_map(self, idx, np_random=None):
     '''Generate a single map
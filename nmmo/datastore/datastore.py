@@ -36,6 +36,12 @@ class DataTable:
   def get(self, ids: List[id]):
     raise NotImplementedError
 
+  def get_column(self, rows, col):
+    raise NotImplementedError
+
+  def set_column(self, rows, col, values):
+    raise NotImplementedError
+
   def where_in(self, col: int, values: List):
     raise NotImplementedError
 
@@ -62,14 +68,25 @@ class DatastoreRecord:
     self.datastore = datastore
     self.table = table
     self.id = row_id
+    # The values at delete(). The row is freed for reuse by another record,
+    # so reads and writes of a deleted record, e.g. post-mortem stats, use these
+    self._deleted_row = None
 
   def update(self, col: int, value):
+    if self._deleted_row is not None:
+      self._deleted_row[col] = value
+      return
     self.table.update(self.id, col, value)
 
   def get(self, col: int):
+    if self._deleted_row is not None:
+      return self._deleted_row[col]
     return self.table.get(self.id)[col]
 
   def delete(self):
+    if self._deleted_row is not None:
+      return
+    self._deleted_row = self.table.get(self.id).copy()
     self.table.remove_row(self.id)
 
 class Datastore:
@@ -26,6 +26,14 @@ class NumpyTable(DataTable):
   def get(self, ids: List[int]):
     return self._data[ids]
 
+  def get_column(self, rows, col):
+    '''Values of the rows in col. col can also be one column per row'''
+    return self._data[rows, col]
+
+  def set_column(self, rows, col, values):
+    '''Bulk update of the rows in col, for the column operations on entities'''
+    self._data[rows, col] = values
+
   def where_eq(self, col: int, value):
     return self._data[self._data[:,col] == value]
 
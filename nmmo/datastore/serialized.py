@@ -3,6 +3,7 @@ from __future__ import annotations
 from ast import Tuple
 
 import math
+from collections import defaultdict
 from types import SimpleNamespace
 from typing import Dict, List
 from nmmo.datastore.datastore import Datastore, DatastoreRecord
@@ -20,6 +21,12 @@ The SerializedAttribute class represents a single attribute of a
 record and provides methods for updating and querying its value,
 as well as enforcing minimum and maximum bounds on the value.
 
+The TableAttribute class is a SerializedAttribute that always reads
+its value from the table, for columns that are also updated in bulk.
+
+The StatePool class keeps released SerializedState objects, so that
+new objects of the same class can reuse their attributes.
+
 The SerializedState class serves as a base class for creating
 serialized representations of specific types of data, using a
 list of attribute names to define the structure of the data.
@@ -89,9 +96,59 @@ class SerializedAttribute():
   def __ge__(self, other):
     return self.val >= other
 
+class TableAttribute(SerializedAttribute):
+  '''Integer attributes only, since the table keeps integers and has the only copy'''
+  @property
+  def val(self):
+    return int(self.datastore_record.get(self._column))
+
+  def update(self, value):
+    assert value == int(value), f'Table attribute {self._name} got a non-integer {value}'
+    super().update(value)
+
+class StatePool():
+  '''Released SerializedState objects by class, which are re-initialized in place
+  by their __init__ instead of allocating new objects and attributes
+
+  Released objects are pending until recycle() is called, e.g. at the end of
+  a tick, so that references to them remain valid until then.'''
+  def __init__(self):
+    self._pending: Dict[int, SerializedState] = {}
+    self._free: Dict[type, List[SerializedState]] = defaultdict(list)
+
+  def __len__(self):
+    return sum(len(objs) for objs in self._free.values())
+
+  @staticmethod
+  def new(obj_cls, realm):
+    '''Object of obj_cls for __new__, recycled from the realm pool if there is one'''
+    pool = getattr(realm, "pool", None)
+    obj = pool.acquire(obj_cls) if pool is not None else None
+    return obj if obj is not None else object.__new__(obj_cls)
+
+  def acquire(self, cls):
+    free = self._free.get(cls)
+    return free.pop() if free else None
+
+  def release(self, obj):
+    self._pending[id(obj)] = obj
+
+  def recycle(self):
+    for obj in self._pending.values():
+      self._free[type(obj)].append(obj)
+    self._pending.clear()
+
+  def clear(self):
+    self._pending.clear()
+    self._free.clear()
+
 class SerializedState():
   @staticmethod
-  def subclass(name: str, attributes: List[str]):
+  def subclass(name: str, attributes: List[str], table_attributes: List[str] = ()):
+    # table_attributes are updated with column operations on the table,
+    # so their values are not cached by the attribute objects
+    assert set(table_attributes) <= set(attributes), "Unknown table attributes"
+
     class Subclass(SerializedState):
       _name = name
       State = SimpleNamespace(
@@ -104,16 +161,35 @@ class SerializedState():
                    limits: Dict[str, Tuple[float, float]] = None):
 
         limits = limits or {}
+        if "datastore_record" in self.__dict__:
+          self._reinit_state(datastore, limits)
+          return
+
         self.datastore_record = datastore.create_record(name)
 
         for attr, col in self.State.attr_name_to_col.items():
+          attr_cls = TableAttribute if attr in table_attributes else SerializedAttribute
           try:
             setattr(self, attr,
-              SerializedAttribute(attr, self.datastore_record, col,
+              attr_cls(attr, self.datastore_record, col,
                 *limits.get(attr, (-math.inf, math.inf))))
           except Exception as exc:
             raise RuntimeError('Failed to set attribute "' + attr + '"') from exc
 
+      def _reinit_state(self, datastore, limits):
+        # A recycled object from a StatePool: keep only the attribute objects,
+        # and point them to a new record, as if they were just created
+        cols = self.State.attr_name_to_col
+        for key in [key for key in self.__dict__ if key not in cols]:
+          del self.__dict__[key]
+        record = datastore.create_record(name)
+        # pylint: disable=protected-access
+        for attr, obj in self.__dict__.items():
+          obj.datastore_record = record
+          obj._val = 0
+          obj._min, obj._max = limits.get(attr, (-math.inf, math.inf))
+        self.datastore_record = record
+
       @classmethod
       def parse_array(cls, data) -> SimpleNamespace:
         # Takes in a data array and returns a SimpleNamespace object with
@@ -2,7 +2,7 @@ import math
 from types import SimpleNamespace
 import numpy as np
 
-from nmmo.datastore.serialized import SerializedState
+from nmmo.datastore.serialized import SerializedState, StatePool
 from nmmo.systems import inventory
 from nmmo.lib.event_code import EventCode
 
@@ -48,7 +48,12 @@ EntityState = SerializedState.subclass(
     "carving_exp",
     "alchemy_level",
     "alchemy_exp",
-  ])
+  ],
+  # Updated for all entities at once, see EntityGroup.update(), PlayerManager.update()
+  # and skill.add_xp()
+  table_attributes=["damage", "time_alive", "freeze", "attacker_id", "food", "water",
+                    "melee_level", "range_level", "mage_level", "fishing_level",
+                    "herbalism_level", "prospecting_level", "carving_level", "alchemy_level"])
 
 EntityState.Limits = lambda config: {
   **{
@@ -139,32 +144,39 @@ class Resources:
     if not self.config.RESOURCE_SYSTEM_ENABLED or immortal:
       return
 
-    regen = self.config.RESOURCE_HEALTH_RESTORE_FRACTION
-    thresh = self.config.RESOURCE_HEALTH_REGEN_THRESHOLD
-
-    food_thresh = self.food > thresh * self.config.RESOURCE_BASE
-    water_thresh = self.water > thresh * self.config.RESOURCE_BASE
-
-    org_health = self.health.val
-    if food_thresh and water_thresh:
-      restore = np.floor(self.health.max * regen)
-      self.health.increment(restore)
-
-    if self.food.empty:
-      starvation_damage = self.config.RESOURCE_STARVATION_RATE
-      if self.resilient:
-        starvation_damage *= self.config.RESOURCE_DAMAGE_REDUCTION
-      self.health.decrement(int(starvation_damage))
-
-    if self.water.empty:
-      dehydration_damage = self.config.RESOURCE_DEHYDRATION_RATE
-      if self.resilient:
-        dehydration_damage *= self.config.RESOURCE_DAMAGE_REDUCTION
-      self.health.decrement(int(dehydration_damage))
-
     # records both increase and decrease in health due to food and water
+    org_health = self.health.val
+    self.health.update(float(self.regen_health(
+      self.config, org_health, self.food.val, self.water.val, self.resilient)))
     self.health_restore = self.health.val - org_health
 
+  # The resource kernels take scalars or arrays, so that PlayerManager can
+  # update all players at once with the same rules
+  @staticmethod
+  def regen_health(config, health, food, water, resilient):
+    '''Health after regen, starvation and dehydration, given food and water
+    before this tick's depletion'''
+    thresh = config.RESOURCE_HEALTH_REGEN_THRESHOLD * config.RESOURCE_BASE
+    restore = np.floor(config.PLAYER_BASE_HEALTH * config.RESOURCE_HEALTH_RESTORE_FRACTION)
+    health = np.where((food > thresh) & (water > thresh),
+                      np.minimum(health + restore, config.PLAYER_BASE_HEALTH), health)
+    for empty, rate in [(food == 0, config.RESOURCE_STARVATION_RATE),
+                        (water == 0, config.RESOURCE_DEHYDRATION_RATE)]:
+      damage = np.where(resilient, int(rate * config.RESOURCE_DAMAGE_REDUCTION), int(rate))
+      health = np.where(empty, np.maximum(health - damage, 0), health)
+    return health
+
+  @staticmethod
+  def deplete(config, val):
+    '''Food or water after the per-tick depletion'''
+    return np.maximum(val - config.RESOURCE_DEPLETION_RATE, 0)
+
+  @staticmethod
+  def restore(config, val):
+    '''Food or water after eating or drinking'''
+    restore = np.floor(config.RESOURCE_BASE * config.RESOURCE_HARVEST_RESTORE_FRACTION)
+    return np.minimum(val + restore, config.RESOURCE_BASE)
+
   def packet(self):
     data = {}
     data['health'] = { 'val': self.health.val, 'max': self.config.PLAYER_BASE_HEALTH }
@@ -179,10 +191,6 @@ class Status:
   def __init__(self, ent):
     self.freeze = ent.freeze
 
-  def update(self):
-    if self.frozen:
-      self.freeze.decrement(1)
-
   def packet(self):
     data = {}
     data['freeze'] = self.freeze.val
@@ -212,15 +220,13 @@ class History:
     self.last_pos = None
 
   def update(self, entity, actions):
+    # damage and time_alive are updated by EntityGroup.update()
     self.attack = None
-    self.damage.update(0)
 
     self.actions = {}
     if entity.ent_id in actions:
       self.actions = actions[entity.ent_id]
 
-    self.time_alive.increment()
-
   def packet(self):
     data = {}
     data['damage'] = self.damage.val
@@ -253,6 +259,10 @@ class History:
 
 # pylint: disable=no-member
 class Entity(EntityState):
+  def __new__(cls, *args, **kwargs):
+    # Reuse a released entity with config.POOL_OBJECTS. __init__ re-initializes it
+    return StatePool.new(cls, args[0] if args else kwargs.get("realm"))
+
   def __init__(self, realm, pos, entity_id, name):
     super().__init__(realm.datastore, EntityState.Limits(realm.config))
 
@@ -305,17 +315,15 @@ class Entity(EntityState):
     return data
 
   def update(self, realm, actions):
-    '''Update occurs after actions, e.g. does not include history'''
-    self._pos = None
+    '''Update occurs after actions, e.g. does not include history
 
-    if self.history.damage == 0:
-      self.attacker = None
-      self.attacker_id.update(0)
+    The per-tick counters (damage, time_alive, freeze, attacker_id) of all
+    entities are updated beforehand by EntityGroup.update()'''
+    self._pos = None
 
     if realm.config.EQUIPMENT_SYSTEM_ENABLED:
-      self.item_level.update(self.equipment.total(lambda e: e.level))
+      self.item_level.update(self.equipment.item_level)
 
-    self.status.update()
     self.history.update(self, actions)
 
   # Returns True if the entity is alive
@@ -1,9 +1,11 @@
 from collections.abc import Mapping
 from typing import Dict
 
-from nmmo.entity.entity import Entity, EntityState
+import numpy as np
+
+from nmmo.entity.entity import Entity, EntityState, Resources
 from nmmo.entity.player import Player
-from nmmo.lib import spawn, event_code
+from nmmo.lib import material, spawn, event_code
 
 
 class EntityGroup(Mapping):
@@ -17,6 +19,8 @@ class EntityGroup(Mapping):
     self.entities: Dict[int, Entity] = {}
     self.dead_this_tick: Dict[int, Entity] = {}
     self._delete_dead_entity = True  # is default
+    self._row_ids = None
+    self._culled = []  # released to the realm pool on reset, with POOL_OBJECTS
 
   def __len__(self):
     return len(self.entities)
@@ -41,6 +45,17 @@ class EntityGroup(Mapping):
   def packet(self):
     return {k: v.packet() for k, v in self.corporeal.items()}
 
+  @property
+  def row_ids(self):
+    '''Entity table rows of the entities, in the same order as self.entities'''
+    if self._row_ids is None:
+      self._row_ids = np.array([ent.datastore_record.id for ent in self.entities.values()],
+                               dtype=int)
+    return self._row_ids
+
+  def _clear_row_cache(self):
+    self._row_ids = None
+
   def reset(self, np_random, delete_dead_entity=True):
     self._np_random = np_random # reset the RNG
     self._delete_dead_entity = delete_dead_entity
@@ -51,49 +66,161 @@ class EntityGroup(Mapping):
           item.destroy()
       ent.datastore_record.delete()
 
+    if self.realm.pool is not None:
+      for ent in self._culled + list(self.entities.values()):
+        self.realm.pool.release(ent)
+    self._culled.clear()
     self.entities.clear()
     self.dead_this_tick.clear()
+    self._clear_row_cache()
 
   def spawn_entity(self, entity):
     pos, ent_id = entity.pos, entity.id.val
     self.realm.map.tiles[pos].add_entity(entity)
     self.entities[ent_id] = entity
+    self._clear_row_cache()
 
   def cull_entity(self, entity):
     pos, ent_id = entity.pos, entity.id.val
     self.realm.map.tiles[pos].remove_entity(ent_id)
-    self.entities.pop(ent_id)
     # destroy the remaining items (of starved/dehydrated players)
     #    of the agents who don't go through receive_damage()
+    # before the entity is gone, so that the items are taken off it
     if self.config.ITEM_SYSTEM_ENABLED:
       for item in list(entity.inventory.items):
         item.destroy()
+    self.entities.pop(ent_id)
+    self._clear_row_cache()
     if ent_id > 0:
       self.realm.event_log.record(event_code.EventCode.AGENT_CULLED, entity)
 
   def cull(self):
     self.dead_this_tick.clear()
-    for ent in [ent for ent in self.entities.values() if not ent.alive]:
+    if not self.entities:
+      return self.dead_this_tick
+
+    # Query the health column at once, and visit the dead in the order of self.entities
+    health = EntityState.State.table(self.datastore).get_column(
+      self.row_ids, EntityState.State.attr_name_to_col["health"])
+    dead = np.flatnonzero(health <= 0)
+    if len(dead) == 0:
+      return self.dead_this_tick
+
+    entities = list(self.entities.values())
+    for ent in [entities[idx] for idx in dead]:
       self.dead_this_tick[ent.ent_id] = ent
       self.cull_entity(ent)
+      if self.realm.pool is not None:
+        self._culled.append(ent)
       if self._delete_dead_entity:
         ent.datastore_record.delete()
     return self.dead_this_tick
 
   def update(self, actions):
-    # # batch updates
-    # # time_alive, damage are from entity.py, History.update()
-    # ent_idx = self._entity_table[:, EntityState.State.attr_name_to_col["id"]] != 0
-    # self._entity_table[ent_idx, EntityState.State.attr_name_to_col["time_alive"]] += 1
-    # self._entity_table[ent_idx, EntityState.State.attr_name_to_col["damage"]] = 0
-    # # freeze from entity.py, Status.update()
-    # freeze_idx = self._entity_table[:, EntityState.State.attr_name_to_col["freeze"]] > 0
-    # self._entity_table[freeze_idx, EntityState.State.attr_name_to_col["freeze"]] -= 1
-
+    self._update_counters()
     for entity in self.entities.values():
       entity.update(self.realm, actions)
 
+  def _update_counters(self):
+    '''Per-tick counters of all entities, as column operations on the Entity table'''
+    if not self.entities:
+      return
+
+    table = EntityState.State.table(self.datastore)
+    cols = EntityState.State.attr_name_to_col
+    rows = self.row_ids
+
+    # Forget the attacker after a tick without damage
+    no_damage = table.get_column(rows, cols["damage"]) == 0
+    table.set_column(rows[no_damage], cols["attacker_id"], 0)
+    for entity, reset in zip(self.entities.values(), no_damage):
+      if reset:
+        entity.attacker = None
+
+    freeze = table.get_column(rows, cols["freeze"])
+    table.set_column(rows, cols["freeze"], np.where(freeze > 0, freeze - 1, freeze))
+    table.set_column(rows, cols["damage"], 0)
+    table.set_column(rows, cols["time_alive"], table.get_column(rows, cols["time_alive"]) + 1)
+
 class PlayerManager(EntityGroup):
+  def update(self, actions):
+    fog_damage = self._fog_damage()
+    if fog_damage is None:
+      fog_damage = [None] * len(self.entities)
+
+    # Same steps as Player.update(), with the resources updated for all players at once
+    self._update_counters()
+    players = list(self.entities.values())
+    for player, damage in zip(players, fog_damage):
+      player.update_fog(self.realm, actions, damage)
+
+    alive = np.array([player.alive for player in players], dtype=bool)
+    players = [player for player, is_alive in zip(players, alive) if is_alive]
+    if not players:
+      return
+
+    drink, eat = self._update_resources(players, self.row_ids[alive])
+    for player, drank, can_eat in zip(players, drink, eat):
+      player.update_skills(drank, can_eat)
+
+  def _update_resources(self, players, rows):
+    '''Health regen, starvation, dehydration, and food and water depletion of the
+    given live players, as one pass over the Entity table columns
+
+    Returns which players drink this tick, and which stand on food. Drinking
+    only restores water, so it is applied here. Eating depletes the tile, so it
+    is left to the caller, in player order.'''
+    config = self.config
+    cols = EntityState.State.attr_name_to_col
+    table = EntityState.State.table(self.datastore)
+
+    start_health = np.array([player.resources.health.val for player in players], dtype=float)
+    health = start_health.copy()
+    if config.PLAYER_HEALTH_INCREMENT > 0:
+      health = np.minimum(health + config.PLAYER_HEALTH_INCREMENT, config.PLAYER_BASE_HEALTH)
+
+    drink = eat = np.zeros(len(players), dtype=bool)
+    mortal = np.array([not (config.IMMORTAL or player.immortal) for player in players],
+                      dtype=bool)
+    if config.RESOURCE_SYSTEM_ENABLED and mortal.any():
+      # Read every tick, since the flag can be changed on a live player
+      resilient = np.array([player.resources.resilient for player in players], dtype=bool)
+      food = table.get_column(rows, cols["food"]).astype(float)
+      water = table.get_column(rows, cols["water"]).astype(float)
+
+      # Regen, starvation and dehydration depend on food and water before depletion
+      org_health = health.copy()
+      health[mortal] = Resources.regen_health(
+        config, health[mortal], food[mortal], water[mortal], resilient[mortal])
+      for idx in np.flatnonzero(mortal):
+        players[idx].resources.health_restore = health[idx] - org_health[idx]
+
+      # Deplete, then drink from an adjacent water tile
+      realm_map = self.realm.map
+      pos_r, pos_c = table.get_column(rows, cols["row"]), table.get_column(rows, cols["col"])
+      drink = mortal & (realm_map.adjacent[material.Water.index][pos_r, pos_c] > 0)
+      eat = mortal & (realm_map.state_map[pos_r, pos_c] == material.Foilage.index)
+      water[mortal] = Resources.deplete(config, water[mortal])
+      water[drink] = Resources.restore(config, water[drink])
+      food[mortal] = Resources.deplete(config, food[mortal])
+      table.set_column(rows, cols["water"], water)
+      table.set_column(rows, cols["food"], food)
+
+    for idx in np.flatnonzero(health != start_health):
+      players[idx].resources.health.update(health[idx])
+
+    return drink, eat
+
+  def _fog_damage(self):
+    '''Death fog damage of all players, gathered from the fog map at once'''
+    fog = self.config.DEATH_FOG_ONSET
+    if fog is None or self.realm.tick < fog or not self.entities:
+      return None
+
+    cols = EntityState.State.attr_name_to_col
+    rows = EntityState.State.table(self.datastore).get(self.row_ids)
+    return self.realm.fog_map[rows[:, cols['row']], rows[:, cols['col']]]
+
   def spawn(self, agent_loader: spawn.SequentialLoader = None):
     if agent_loader is None:
       agent_loader = self.config.PLAYER_LOADER(self.config, self._np_random)
@@ -27,14 +27,17 @@ def get_habitable_dir(ent):
       return direction
   return Action.North
 
-def meander_toward(ent, goal, dist_crit=10, toward_weight=3):
+def meander_toward(ent, goal, dist_crit=10, toward_weight=3, shared_goal=False, batch=None):
   r, c = ent.pos
   delta_r, delta_c = goal[0] - r, goal[1] - c
   abs_dr, abs_dc = abs(delta_r), abs(delta_c)
   dist_l1 = abs_dr + abs_dc
   # If close (less than dist_crit), use expensive aStar
+  # Fixed goals shared by many entities use the map's flow field instead
   if dist_l1 <= dist_crit:
-    delta = astar.aStar(ent.realm.map, ent.pos, goal)
+    delta = ent.realm.map.flow_step(ent.pos, goal) if shared_goal else None
+    if delta is None:
+      delta = astar.aStar(ent.realm.map, ent.pos, goal)
     return move_action(DELTA_TO_DIR[delta] if delta in DELTA_TO_DIR else None)
 
   # Otherwise, use a weighted random walk
@@ -53,6 +56,8 @@ def meander_toward(ent, goal, dist_crit=10, toward_weight=3):
     return move_action(Action.North)
   if len(cand_dirs) == 1:
     return move_action(cand_dirs[0])
+  if batch is not None:
+    return batch.walk(cand_dirs, weights)
   weights = np.array(weights)
   # pylint: disable=protected-access
   return move_action(ent._np_random.choice(cand_dirs, p=weights/np.sum(weights)))
@@ -61,6 +66,88 @@ def move_action(direction):
   return {Action.Move: {Action.Direction: direction}} if direction else {}
 
 
+class DecisionBatch:
+  '''Closest targets and random moves of the NPC decisions in a tick, for all NPCs at once
+
+  The closest targets are searched in one pass over the Entity table. The random moves
+  are requested by the NPCs in turn, and sampled together by sample_moves() in the same
+  order, so that the actions and the RNG draws are the same as deciding one by one.'''
+  def __init__(self, realm, npcs):
+    self.realm = realm
+    self._npcs = npcs
+    self._closest = None
+    self._meanders = []  # (position, move to fill)
+    self._walks = []  # (candidate directions, weights, move to fill)
+
+  def closest_target(self, ent):
+    '''Same as utils.identify_closest_target(ent)'''
+    if self._closest is None:
+      self._closest = dict(zip((npc.ent_id for npc in self._npcs), self._search_targets()))
+    ent_id = self._closest[ent.ent_id]
+    return None if ent_id is None else self.realm.entity(ent_id)
+
+  def _search_targets(self):
+    config = self.realm.config
+    cols = entity.EntityState.State.attr_name_to_col
+    cands = entity.EntityState.Query.table(self.realm.datastore)
+    attackable = cands[:, cols["npc_type"]] >= 0  # no immortal (-1)
+    if config.NPC_SYSTEM_ENABLED and not config.NPC_ALLOW_ATTACK_OTHER_NPCS:
+      attackable &= cands[:, cols["id"]] > 0
+    cands = cands[attackable]
+    if len(cands) == 0:
+      return [None] * len(self._npcs)
+
+    # linf distance of all NPCs to all candidates, the closest first in table order
+    pos = np.array([npc.pos for npc in self._npcs], dtype=cands.dtype).reshape(-1, 2)
+    dist = np.maximum(np.abs(pos[:, 0:1] - cands[:, cols["row"]]),
+                      np.abs(pos[:, 1:2] - cands[:, cols["col"]]))
+    closest = dist.argmin(axis=1)
+    found = dist[np.arange(len(closest)), closest] <= config.PLAYER_VISION_RADIUS
+    ent_ids = cands[closest, cols["id"]]
+    return [int(ent_id) if is_found else None for ent_id, is_found in zip(ent_ids, found)]
+
+  def meander(self, ent):
+    '''Same as move_action(get_habitable_dir(ent)), filled by sample_moves()'''
+    move = {Action.Direction: None}
+    self._meanders.append((ent.pos, move))
+    return {Action.Move: move}
+
+  def walk(self, cand_dirs, weights):
+    '''Same as the weighted random walk in meander_toward(), filled by sample_moves()'''
+    move = {Action.Direction: None}
+    self._walks.append((cand_dirs, weights, move))
+    return {Action.Move: move}
+
+  def sample_moves(self):
+    # pylint: disable=protected-access
+    np_random = self.realm._np_random
+    if self._meanders:
+      pos = np.array([pos for pos, _ in self._meanders])
+      # Directions are tried from the random start, in the order of DIRECTIONS
+      order = (np_random.get_directions(len(pos))[:, None] + np.arange(4)) % 4
+      deltas = np.array([(dr, dc) for dr, dc, _ in DIRECTIONS[:4]])[order]
+      habitable = self.realm.map.habitable_tiles[
+        pos[:, 0:1] + deltas[..., 0], pos[:, 1:2] + deltas[..., 1]] > 0
+      first = order[np.arange(len(order)), habitable.argmax(axis=1)]
+      first[~habitable.any(axis=1)] = 0  # North
+      for (_, move), dir_idx in zip(self._meanders, first):
+        move[Action.Direction] = DIRECTIONS[dir_idx][2]
+
+    if self._walks:
+      # As Generator.choice(), which draws one uniform sample per call
+      weights = np.zeros((len(self._walks), 4))
+      for idx, (_, walk_weights, _) in enumerate(self._walks):
+        weights[idx, :len(walk_weights)] = walk_weights
+      cdf = (weights / np.sum(weights, axis=1, keepdims=True)).cumsum(axis=1)
+      cdf /= cdf[:, -1:]
+      choice = (cdf <= np_random.random(len(self._walks))[:, None]).sum(axis=1)
+      for (cand_dirs, _, move), idx in zip(self._walks, choice):
+        move[Action.Direction] = cand_dirs[idx]
+
+    self._meanders.clear()
+    self._walks.clear()
+
+
 class Equipment:
   def __init__(self, total,
     melee_attack, range_attack, mage_attack,
@@ -79,6 +166,10 @@ class Equipment:
   def total(self, getter):
     return getter(self)
 
+  @property
+  def item_level(self):
+    return self.level
+
   # pylint: disable=R0801
   # Similar lines here and in inventory.py
   @property
@@ -110,13 +201,14 @@ class NPC(entity.Entity):
   def is_npc(self) -> bool:
     return True
 
-  def update(self, realm, actions):
+  def update(self, realm, actions, elapsed=1):
+    '''elapsed is the number of ticks since the last update, with NPC_LOD_ENABLED'''
     super().update(realm, actions)
 
     if not self.alive:
       return
 
-    self.resources.health.increment(1)
+    self.resources.health.increment(elapsed)
     self.last_action = actions
 
   def can_see(self, target):
@@ -129,7 +221,9 @@ class NPC(entity.Entity):
     delta = astar.aStar(self.realm.map, self.pos, goal)
     return move_action(DELTA_TO_DIR[delta] if delta in DELTA_TO_DIR else None)
 
-  def _meander(self):
+  def _meander(self, batch=None):
+    if batch is not None:
+      return batch.meander(self)
     return move_action(get_habitable_dir(self))
 
   def can_attack(self, target):
@@ -140,14 +234,17 @@ class NPC(entity.Entity):
     distance = utils.linf_single(self.pos, target.pos)
     return distance <= self.skills.style.attack_range(self.realm.config)
 
-  def _has_target(self, search=False):
+  def _has_target(self, search=False, batch=None):
     if self.target and (not self.target.alive or not self.can_see(self.target)):
       self.target = None
     # NOTE: when attacked by several agents, this will always target the last attacker
     if self.attacker and self.target is None:
       self.target = self.attacker
     if self.target is None and search is True:
-      self.target = utils.identify_closest_target(self)
+      if batch is None:
+        self.target = utils.identify_closest_target(self)
+      else:
+        self.target = batch.closest_target(self)
     return self.target
 
   def _add_attack_action(self, actions, target):
@@ -270,26 +367,26 @@ class Passive(NPC):
   def __init__(self, realm, pos, iden, name=None):
     super().__init__(realm, pos, iden, name or "Passive", 1)
 
-  def decide(self):
+  def decide(self, batch=None):
     # Move only, no attack
-    return self._meander()
+    return self._meander(batch)
 
 class PassiveAggressive(NPC):
   def __init__(self, realm, pos, iden, name=None):
     super().__init__(realm, pos, iden, name or "Neutral", 2)
 
-  def decide(self):
+  def decide(self, batch=None):
     if self._has_target() is None:
-      return self._meander()
+      return self._meander(batch)
     return self._charge_toward(self.target)
 
 class Aggressive(NPC):
   def __init__(self, realm, pos, iden, name=None):
     super().__init__(realm, pos, iden, name or "Hostile", 3)
 
-  def decide(self):
-    if self._has_target(search=True) is None:
-      return self._meander()
+  def decide(self, batch=None):
+    if self._has_target(search=True, batch=batch) is None:
+      return self._meander(batch)
     return self._charge_toward(self.target)
 
 class Soldier(NPC):
@@ -314,27 +411,27 @@ class Soldier(NPC):
     if self.rally_point and utils.linf_single(self.pos, self.rally_point) <= radius:
       self.rally_point = None
 
-  def decide(self):
+  def decide(self, batch=None):
     self._is_order_done()
     # NOTE: destroying the target entity is the highest priority
-    if self.target_entity is None and self._has_target(search=True):
+    if self.target_entity is None and self._has_target(search=True, batch=batch):
       if self.can_attack(self.target):
         return self._charge_toward(self.target)
 
-    actions = self._decide_move_action()
+    actions = self._decide_move_action(batch)
     self._decide_attack_action(actions)
     return actions
 
-  def _decide_move_action(self):
+  def _decide_move_action(self, batch=None):
     # in the order of priority
     if self.target_entity:
       return self._move_toward(self.target_entity.pos)
     if self.target:
       # If it"s close enough, it will use A*. Otherwise, random.
-      return meander_toward(self, self.target.pos)
+      return meander_toward(self, self.target.pos, batch=batch)
     if self.rally_point:
-      return meander_toward(self, self.rally_point)
-    return self._meander()
+      return meander_toward(self, self.rally_point, shared_goal=True, batch=batch)
+    return self._meander(batch)
 
   def _decide_attack_action(self, actions):
     # The default is to attack the target entity, if within range
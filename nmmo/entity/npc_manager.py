@@ -1,6 +1,9 @@
 from typing import Callable
+import numpy as np
+
+from nmmo.entity.entity import EntityState
 from nmmo.entity.entity_manager import EntityGroup
-from nmmo.entity.npc import NPC, Soldier, Aggressive, PassiveAggressive, Passive
+from nmmo.entity.npc import NPC, Soldier, Aggressive, PassiveAggressive, Passive, DecisionBatch
 from nmmo.core import action
 from nmmo.systems import combat
 from nmmo.lib import spawn
@@ -12,13 +15,86 @@ class NPCManager(EntityGroup):
     self.next_id = -1
     self.spawn_dangers = []
 
+    # Level of detail, with NPC_LOD_ENABLED
+    self._active = self.entities  # NPCs to decide and update this tick
+    self._last_update = {}  # tick of the last update of the far NPCs
+    # Number of NPCs near players, far from players, and far ones not updated this tick
+    self.lod_counts = {"near": 0, "far": 0, "idle": 0}
+
   def reset(self, np_random):
     super().reset(np_random)
     self.next_id = -1
     self.spawn_dangers.clear()
+    self._active = self.entities
+    self._last_update.clear()
+    self.lod_counts = {"near": 0, "far": 0, "idle": 0}
 
   def actions(self):
-    return {idx: entity.decide() for idx, entity in self.entities.items()}
+    self._active = self._schedule()
+    if not (self.config.NPC_SYSTEM_ENABLED and self.config.NPC_BATCH_DECISIONS):
+      return {idx: entity.decide() for idx, entity in self._active.items()}
+
+    batch = DecisionBatch(self.realm, list(self._active.values()))
+    actions = {idx: entity.decide(batch) for idx, entity in self._active.items()}
+    batch.sample_moves()
+    return actions
+
+  def update(self, actions):
+    if self._active is self.entities:
+      super().update(actions)
+      return
+
+    # Idle NPCs only get the per-tick counters, and catch up on the next update
+    self._update_counters()
+    tick = self.realm.tick
+    for ent_id, entity in self._active.items():
+      if ent_id in self.entities:
+        entity.update(self.realm, actions, tick - self._last_update[ent_id])
+        self._last_update[ent_id] = tick
+
+  def spawn_entity(self, entity):
+    super().spawn_entity(entity)
+    # Spawned after this tick's update, so the first update counts one tick
+    self._last_update[entity.ent_id] = self.realm.tick - 1
+
+  def cull(self):
+    dead = super().cull()
+    for ent_id in dead:
+      self._last_update.pop(ent_id, None)
+    return dead
+
+  def _schedule(self):
+    '''NPCs to update this tick: all NPCs, or with NPC_LOD_ENABLED, the ones with
+    a player within NPC_LOD_RADIUS and the far ones whose turn it is'''
+    config = self.config
+    if not (config.NPC_SYSTEM_ENABLED and config.NPC_LOD_ENABLED) or not self.entities:
+      self.lod_counts = {"near": len(self.entities), "far": 0, "idle": 0}
+      return self.entities
+
+    # After a tick that updated every NPC, e.g. when NPC_LOD_ENABLED was just set
+    tick, interval = self.realm.tick, config.NPC_LOD_INTERVAL
+    if self._active is self.entities:
+      self._last_update = dict.fromkeys(self.entities, tick - 1)
+
+    cols = EntityState.State.attr_name_to_col
+    table = EntityState.State.table(self.datastore)
+    npc_pos = table.get(self.row_ids)[:, [cols["row"], cols["col"]]]
+    player_pos = table.get(self.realm.players.row_ids)[:, [cols["row"], cols["col"]]]
+    near = np.zeros(len(npc_pos), dtype=bool)
+    if len(player_pos) > 0:
+      dist = np.maximum(np.abs(npc_pos[:, 0:1] - player_pos[:, 0]),
+                        np.abs(npc_pos[:, 1:2] - player_pos[:, 1]))
+      near = (dist <= config.NPC_LOD_RADIUS).any(axis=1)
+
+    # Far NPCs take turns, so that about the same number is updated every tick
+    active = {}
+    for (ent_id, entity), is_near in zip(self.entities.items(), near):
+      if is_near or (tick + ent_id) % interval == 0:
+        active[ent_id] = entity
+    num_near = int(near.sum())
+    self.lod_counts = {"near": num_near, "far": len(near) - num_near,
+                       "idle": len(self.entities) - len(active)}
+    return active
 
   def default_spawn(self):
     config = self.config
@@ -40,7 +116,7 @@ class NPCManager(EntityGroup):
 
       npc = NPC.default_spawn(self.realm, (r, c), self.next_id, self._np_random)
       if npc:
-        super().spawn_entity(npc)
+        self.spawn_entity(npc)
         self.next_id -= 1
 
   def spawn_npc(self, r, c, danger=None, name=None, order=None,
@@ -63,7 +139,7 @@ class NPCManager(EntityGroup):
       return None
 
     if npc:
-      super().spawn_entity(npc)
+      self.spawn_entity(npc)
       self.next_id -= 1
       # NOTE: randomly set the combat style. revisit later
       npc.skills.style = self._np_random.choice([action.Melee, action.Range, action.Mage])
@@ -134,8 +134,22 @@ class Player(entity.Entity):
       "DamageTaken": self.history.damage_received,}
     return data
 
-  def update(self, realm, actions):
-    '''Post-action update. Do not include history'''
+  def update(self, realm, actions, fog_damage=None):
+    '''Post-action update. Do not include history
+
+    fog_damage is the death fog at the player position, if already known.
+    PlayerManager.update() runs the same steps for all players, with the health,
+    food and water updates batched between update_fog() and update_skills()'''
+    self.update_fog(realm, actions, fog_damage)
+    if not self.alive:
+      return
+
+    if self.config.PLAYER_HEALTH_INCREMENT > 0:
+      self.resources.health.increment(self.config.PLAYER_HEALTH_INCREMENT)
+    self.resources.update(self.immortal)
+    self.update_skills()
+
+  def update_fog(self, realm, actions, fog_damage=None):
     super().update(realm, actions)
 
     # Spawn battle royale style death fog
@@ -147,17 +161,22 @@ class Player(entity.Entity):
     # MAP_CENTER / 2 + 100 ticks after spawning
     fog = self.config.DEATH_FOG_ONSET
     if fog is not None and self.realm.tick >= fog:
-      dmg = self.realm.fog_map[self.pos]
+      dmg = self.realm.fog_map[self.pos] if fog_damage is None else fog_damage
       if dmg > 0.5:  # fog_map has float values
         self.receive_damage(None, round(dmg))
 
-    if not self.alive:
-      return
-
-    if self.config.PLAYER_HEALTH_INCREMENT > 0:
-      self.resources.health.increment(self.config.PLAYER_HEALTH_INCREMENT)
-    self.resources.update(self.immortal)
-    self.skills.update()
+  def update_skills(self, drank=None, can_eat=None):
+    '''drank and can_eat are given when water and food were already depleted,
+    and water restored, by PlayerManager.update()'''
+    if drank is None:
+      self.skills.update()
+    else:
+      # Water and food come last in the skills
+      self.skills.update(basic=False)
+      if drank:
+        self.realm.event_log.record(EventCode.DRINK_WATER, self)
+      if can_eat:
+        self.skills.food.eat()
 
     if self._make_mortal_tick is not None and self.realm.tick >= self._make_mortal_tick:
       self._set_immortal(False)
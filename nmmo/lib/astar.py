@@ -1,9 +1,50 @@
 #pylint: disable=invalid-name
 import heapq
-from nmmo.lib.utils import in_bounds
+from collections import OrderedDict
+import numpy as np
 
 CUTOFF = 100
 
+class PathfindingCache:
+  '''LRU cache of A* first steps, keyed by (start, goal), or of flow fields by goal
+
+  Paths only depend on tile habitability, so the owner must clear the cache
+  whenever that changes, e.g. when a new map is loaded.
+  '''
+  def __init__(self, max_size):
+    self.max_size = max_size
+    self._cache = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def __len__(self):
+    return len(self._cache)
+
+  def __contains__(self, key):
+    return key in self._cache
+
+  def get(self, key):
+    step = self._cache.get(key)
+    if step is None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    self._cache.move_to_end(key)
+    return step
+
+  def put(self, key, step):
+    if self.max_size <= 0:
+      return
+    self._cache[key] = step
+    self._cache.move_to_end(key)
+    if len(self._cache) > self.max_size:
+      self._cache.popitem(last=False)
+
+  def clear(self):
+    self._cache.clear()
+    self.hits = 0
+    self.misses = 0
+
 def l1(start, goal):
   sr, sc = start
   gr, gc = goal
@@ -13,63 +54,118 @@ def adjacentPos(pos):
   r, c = pos
   return [(r - 1, c), (r, c - 1), (r + 1, c), (r, c + 1)]
 
+class AStar:
+  '''A* on flat tile indices, with buffers reused across searches
+
+  Tiles are indexed in a habitability grid padded by one non-habitable tile on
+  each side, so neighbours never need a bounds check. The cost and parent lists
+  are only valid where stamp equals the current search generation, so they are
+  never cleared between searches.
+  '''
+  def __init__(self, map_size):
+    self.width = map_size + 2
+    size = self.width * self.width
+    self.habitable = None
+    self.cost = [0] * size
+    self.parent = [0] * size
+    self.stamp = [0] * size
+    self.generation = 0
+    # In the order of adjacentPos
+    self.offsets = (-self.width, -1, self.width, 1)
+
+  def clear(self):
+    '''Call when tile habitability changes'''
+    self.habitable = None
+
+  def _load_habitable(self, habitable_tiles):
+    padded = np.pad(habitable_tiles != 0, 1)
+    # in_bounds() excludes the first row and column
+    padded[1, :] = False
+    padded[:, 1] = False
+    self.habitable = padded.ravel().tolist()
+
+  def search(self, realm_map, start, goal, cutoff=CUTOFF):
+    '''First step (dr, dc) from start toward goal, see aStar()'''
+    if self.habitable is None:
+      self._load_habitable(realm_map.habitable_tiles)
+    habitable, cost, parent, stamp = self.habitable, self.cost, self.parent, self.stamp
+    self.generation += 1
+    gen = self.generation
+    width = self.width
+
+    sr, sc = int(start[0]), int(start[1])
+    gr, gc = int(goal[0]), int(goal[1])
+    src = (sr + 1) * width + sc + 1
+    # A goal outside the padded grid has no flat index (it would wrap around), and
+    # is never reached. It still guides the search toward the closest tile
+    dst = (gr + 1) * width + gc + 1 if -1 <= gr < width - 1 and -1 <= gc < width - 1 else -1
+    stamp[src] = gen
+    cost[src] = 0
+    pq = [(0, src)]
+
+    closest = src
+    closest_heuristic = abs(gr - sr) + abs(gc - sc)
+    closest_cost = closest_heuristic
+
+    while pq:
+      # Use approximate solution if budget exhausted
+      cutoff -= 1
+      if cutoff <= 0:
+        if dst < 0 or stamp[dst] != gen or dst == src:
+          dst = closest
+        break
+
+      _, cur = heapq.heappop(pq)
+      if cur == dst:
+        break
+
+      new_cost = cost[cur] + 1
+      for offset in self.offsets:
+        nxt = cur + offset
+        if not habitable[nxt]:
+          continue
+        if stamp[nxt] != gen or new_cost < cost[nxt]:
+          stamp[nxt] = gen
+          cost[nxt] = new_cost
+          parent[nxt] = cur
+          nr, nc = divmod(nxt, width)
+          heuristic = abs(gr + 1 - nr) + abs(gc + 1 - nc)
+          priority = new_cost + heuristic
+
+          # Compute approximate solution
+          if heuristic < closest_heuristic or (
+              heuristic == closest_heuristic and priority < closest_cost):
+            closest = nxt
+            closest_heuristic = heuristic
+            closest_cost = priority
+
+          heapq.heappush(pq, (priority, nxt))
+
+    # Cache the first step toward goal from every tile on the path
+    cache = realm_map.pathfinding_cache
+    while dst >= 0 and stamp[dst] == gen and dst != src and parent[dst] != src:
+      nxt, dst = dst, parent[dst]
+      r, c = divmod(dst, width)
+      cache.put(((r - 1, c - 1), goal), self._delta(nxt - dst))
+
+    if dst < 0:  # searched everything before the cutoff
+      step = (gr - sr, gc - sc)
+    else:
+      r, c = divmod(dst, width)
+      step = (r - 1 - sr, c - 1 - sc)
+    cache.put((start, goal), step)
+    return step
+
+  def _delta(self, offset):
+    if offset in (1, -1):
+      return (0, offset)
+    return (offset // self.width, 0)
+
 def aStar(realm_map, start, goal, cutoff = CUTOFF):
-  tiles = realm_map.tiles
   if start == goal:
     return (0, 0)
-  if (start, goal) in realm_map.pathfinding_cache:
-    return realm_map.pathfinding_cache[(start, goal)]
-  initial_goal = goal
-  pq = [(0, start)]
-
-  backtrace = {}
-  cost = {start: 0}
-
-  closestPos = start
-  closestHeuristic = l1(start, goal)
-  closestCost = closestHeuristic
-
-  while pq:
-    # Use approximate solution if budget exhausted
-    cutoff -= 1
-    if cutoff <= 0:
-      if goal not in backtrace:
-        goal = closestPos
-      break
-
-    priority, cur = heapq.heappop(pq)
-
-    if cur == goal:
-      break
-
-    for nxt in adjacentPos(cur):
-      if not in_bounds(*nxt, tiles.shape) or realm_map.habitable_tiles[nxt] == 0:
-        continue
-
-      newCost = cost[cur] + 1
-      if nxt not in cost or newCost < cost[nxt]:
-        cost[nxt] = newCost
-        heuristic = l1(goal, nxt)
-        priority = newCost + heuristic
-
-        # Compute approximate solution
-        if heuristic < closestHeuristic or (
-            heuristic == closestHeuristic and priority < closestCost):
-          closestPos = nxt
-          closestHeuristic = heuristic
-          closestCost = priority
-
-        heapq.heappush(pq, (priority, nxt))
-        backtrace[nxt] = cur
-
-  while goal in backtrace and backtrace[goal] != start:
-    gr, gc = goal
-    goal = backtrace[goal]
-    sr, sc = goal
-    realm_map.pathfinding_cache[(goal, initial_goal)] = (gr - sr, gc - sc)
-
-  sr, sc = start
-  gr, gc = goal
-  realm_map.pathfinding_cache[(start, initial_goal)] = (gr - sr, gc - sc)
-  return (gr - sr, gc - sc)
+  cached = realm_map.pathfinding_cache.get((start, goal))
+  if cached is not None:
+    return cached
+  return realm_map.pathfinder.search(realm_map, start, goal, cutoff)
 # End A*
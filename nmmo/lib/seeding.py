@@ -10,6 +10,7 @@ class RandomNumberGenerator(np.random.Generator):
     self._dir_seq_len = 1024
     self._wrap = self._dir_seq_len - 1
     self._dir_seq = list(self.integers(0, 4, size=self._dir_seq_len))
+    self._dir_arr = np.array(self._dir_seq)
     self._dir_idx = 0
 
   # provide a random direction from the pre-generated sequence
@@ -17,6 +18,13 @@ class RandomNumberGenerator(np.random.Generator):
     self._dir_idx = (self._dir_idx + 1) & self._wrap
     return self._dir_seq[self._dir_idx]
 
+  # the next num directions, same as calling get_direction() num times
+  def get_directions(self, num):
+    idx = (self._dir_idx + 1 + np.arange(num)) & self._wrap
+    if num > 0:
+      self._dir_idx = int(idx[-1])
+    return self._dir_arr[idx]
+
 def np_random(seed: Optional[int] = None) -> Tuple[np.random.Generator, Any]:
   """Generates a random number generator from the seed and returns the Generator and seed.
 
@@ -36,3 +44,14 @@ def np_random(seed: Optional[int] = None) -> Tuple[np.random.Generator, Any]:
   np_seed = seed_seq.entropy
   rng = RandomNumberGenerator(np.random.PCG64(seed_seq))
   return rng, np_seed
+
+def child_np_random(seed: int, idx: int) -> np.random.Generator:
+  """Returns the idx-th independent generator derived from the seed, which is the same
+  as np.random.SeedSequence(seed).spawn(idx+1)[idx]. It depends only on the seed and idx,
+  so tasks (e.g., maps) can be run in any order or in parallel with the same results.
+  """
+  if not (isinstance(seed, (int, np.integer)) and 0 <= seed):
+    raise ValueError(f"Seed must be a non-negative integer, not {seed}")
+
+  seed_seq = np.random.SeedSequence(int(seed), spawn_key=(int(idx),))
+  return RandomNumberGenerator(np.random.PCG64(seed_seq))
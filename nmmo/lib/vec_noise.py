@@ -31,49 +31,73 @@ PERM = np.array([
 ], dtype=np.int32)
 PERM = np.concatenate((PERM, PERM))
 
+# Precomputed lookups: gradient index of each permutation entry, and the gradient x/y
+PERM_MOD12 = PERM % 12
+GRAD_X = GRAD3[:12, 0].astype(float)
+GRAD_Y = GRAD3[:12, 1].astype(float)
+
 # 2D simplex skew factors
 F2 = 0.5 * (np.sqrt(3.0) - 1.0)
 G2 = (3.0 - np.sqrt(3.0)) / 6.0
 
 # https://github.com/zbenjamin/vec_noise/blob/master/_simplex.c#L46
-def snoise2(x, y):
-  """Generate 2D simplex noise for given coordinates."""
+def snoise2(x, y, dtype=np.float64, chunk_size=None):
+  """Generate 2D simplex noise for given coordinates.
+
+  Args:
+    dtype: np.float32 computes the corner contributions in single precision,
+      which is faster but not bit-exact. The simplex cell is always located in
+      double precision, since the coordinates can be large.
+    chunk_size: if given, evaluates chunks of this many points at a time,
+      to bound the size of the temporary arrays
+  """
+  x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+  if chunk_size is None or x.size <= chunk_size:
+    return _snoise2(x, y, dtype)
+
+  shape = x.shape
+  x, y = x.ravel(), y.ravel()
+  out = np.empty(x.size, dtype=dtype)
+  for start in range(0, x.size, chunk_size):
+    end = start + chunk_size
+    out[start:end] = _snoise2(x[start:end], y[start:end], dtype)
+  return out.reshape(shape)
+
+def _snoise2(x, y, dtype):
   s = (x + y) * F2
   i = np.floor(x + s).astype(int)
   j = np.floor(y + s).astype(int)
   t = (i + j) * G2
 
-  x0 = x - (i - t)
-  y0 = y - (j - t)
+  x0 = (x - (i - t)).astype(dtype, copy=False)
+  y0 = (y - (j - t)).astype(dtype, copy=False)
+  g2 = dtype(G2)
 
   # Determine which simplex we're in
   i1 = (x0 > y0).astype(int)
   j1 = 1 - i1
 
-  x1 = x0 - i1 + G2
-  y1 = y0 - j1 + G2
-  x2 = x0 - 1 + 2 * G2
-  y2 = y0 - 1 + 2 * G2
+  x1 = x0 - i1.astype(dtype) + g2
+  y1 = y0 - j1.astype(dtype) + g2
+  x2 = x0 - 1 + 2 * g2
+  y2 = y0 - 1 + 2 * g2
 
   # Hash coordinates of the three simplex corners
   ii = i & 255
   jj = j & 255
-  gi0 = PERM[ii + PERM[jj]] % 12
-  gi1 = PERM[ii + i1 + PERM[jj + j1]] % 12
-  gi2 = PERM[ii + 1 + PERM[jj + 1]] % 12
-
-  # Calculate contribution from three corners
-  t0 = 0.5 - x0**2 - y0**2
-  t1 = 0.5 - x1**2 - y1**2
-  t2 = 0.5 - x2**2 - y2**2
-
-  mask0 = (t0 >= 0).astype(float)
-  mask1 = (t1 >= 0).astype(float)
-  mask2 = (t2 >= 0).astype(float)
-
-  n0 = mask0 * t0**4 * (GRAD3[gi0, 0] * x0 + GRAD3[gi0, 1] * y0)
-  n1 = mask1 * t1**4 * (GRAD3[gi1, 0] * x1 + GRAD3[gi1, 1] * y1)
-  n2 = mask2 * t2**4 * (GRAD3[gi2, 0] * x2 + GRAD3[gi2, 1] * y2)
+  gi0 = PERM_MOD12[ii + PERM[jj]]
+  gi1 = PERM_MOD12[ii + i1 + PERM[jj + j1]]
+  gi2 = PERM_MOD12[ii + 1 + PERM[jj + 1]]
+
+  # Calculate contribution from three corners. Corners with t < 0 contribute 0
+  t0 = np.maximum(0.5 - x0**2 - y0**2, 0)
+  t1 = np.maximum(0.5 - x1**2 - y1**2, 0)
+  t2 = np.maximum(0.5 - x2**2 - y2**2, 0)
+
+  grad_x, grad_y = GRAD_X.astype(dtype), GRAD_Y.astype(dtype)
+  n0 = t0**4 * (grad_x[gi0] * x0 + grad_y[gi0] * y0)
+  n1 = t1**4 * (grad_x[gi1] * x1 + grad_y[gi1] * y1)
+  n2 = t2**4 * (grad_x[gi2] * x2 + grad_y[gi2] * y2)
 
   # Sum up and scale the result
   return 70 * (n0 + n1 + n2)
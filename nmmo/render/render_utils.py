@@ -8,6 +8,8 @@ from nmmo.lib.colors import Neon
 def np_encoder(obj):
   if isinstance(obj, np.generic):
     return obj.item()
+  if isinstance(obj, np.ndarray):
+    return obj.tolist()
 
 def normalize(ary: np.ndarray, norm_std=2):
   R, C         = ary.shape
@@ -5,6 +5,10 @@ import numpy as np
 from nmmo.systems import skill as Skill
 from nmmo.lib.event_code import EventCode
 
+# Attack styles in the order of the batched damage arrays, and skills with a level column
+STYLE_NAMES = ["melee", "range", "mage"]
+LEVEL_SKILLS = STYLE_NAMES + ["fishing", "herbalism", "prospecting", "carving", "alchemy"]
+
 def level(skills):
   return max(e.level.val for e in skills.skills)
 
@@ -23,13 +27,34 @@ def damage_multiplier(config, skill, targ):
 
   return 1.0
 
-# pylint: disable=unnecessary-lambda-assignment
-def attack(realm, attacker, target, skill_fn):
+def attack(realm, attacker, target, skill_fn, damage=None):
+  '''damage is precomputed by batch_damage(), or computed here if None'''
   config       = attacker.config
   skill        = skill_fn(attacker)
   skill_type   = type(skill)
   skill_name   = skill_type.__name__
 
+  if damage is None:
+    damage = attack_damage(config, attacker, target, skill)
+
+  # after tallying ammo damage, consume ammo (i.e., fire) when the skill type matches
+  if config.EQUIPMENT_SYSTEM_ENABLED:
+    ammunition = attacker.equipment.ammunition.item
+    if ammunition is not None and getattr(ammunition, skill_name.lower() + '_attack').val > 0:
+      ammunition.fire(attacker)
+
+  if attacker.is_player:
+    realm.event_log.record(EventCode.SCORE_HIT, attacker, target=target,
+                           combat_style=skill_type, damage=damage)
+
+  attacker.apply_damage(damage, skill.__class__.__name__.lower())
+  target.receive_damage(attacker, damage)
+
+  return damage
+
+def attack_damage(config, attacker, target, skill):
+  skill_type   = type(skill)
+
   # Per-style offense/defense
   level_damage = 0
   if skill_type == Skill.Melee:
@@ -39,8 +64,8 @@ def attack(realm, attacker, target, skill_fn):
       base_damage  = config.PROGRESSION_MELEE_BASE_DAMAGE
       level_damage = config.PROGRESSION_MELEE_LEVEL_DAMAGE
 
-    offense_fn   = lambda e: e.melee_attack
-    defense_fn   = lambda e: e.melee_defense
+    offense_attr = 'melee_attack'
+    defense_attr = 'melee_defense'
 
   elif skill_type == Skill.Range:
     base_damage  = config.COMBAT_RANGE_DAMAGE
@@ -49,8 +74,8 @@ def attack(realm, attacker, target, skill_fn):
       base_damage  = config.PROGRESSION_RANGE_BASE_DAMAGE
       level_damage = config.PROGRESSION_RANGE_LEVEL_DAMAGE
 
-    offense_fn   = lambda e: e.range_attack
-    defense_fn   = lambda e: e.range_defense
+    offense_attr = 'range_attack'
+    defense_attr = 'range_defense'
 
   elif skill_type == Skill.Mage:
     base_damage  = config.COMBAT_MAGE_DAMAGE
@@ -59,8 +84,8 @@ def attack(realm, attacker, target, skill_fn):
       base_damage  = config.PROGRESSION_MAGE_BASE_DAMAGE
       level_damage = config.PROGRESSION_MAGE_LEVEL_DAMAGE
 
-    offense_fn   = lambda e: e.mage_attack
-    defense_fn   = lambda e: e.mage_defense
+    offense_attr = 'mage_attack'
+    defense_attr = 'mage_defense'
 
   elif __debug__:
     assert False, 'Attack skill must be Melee, Range, or Mage'
@@ -83,14 +108,8 @@ def attack(realm, attacker, target, skill_fn):
     skill_defense = 0
 
   if config.EQUIPMENT_SYSTEM_ENABLED:
-    equipment_offense = attacker.equipment.total(offense_fn)
-    equipment_defense = target.equipment.total(defense_fn)
-
-    # after tallying ammo damage, consume ammo (i.e., fire) when the skill type matches
-    ammunition = attacker.equipment.ammunition.item
-    if ammunition is not None and getattr(ammunition, skill_name.lower() + '_attack').val > 0:
-      ammunition.fire(attacker)
-
+    equipment_offense = getattr(attacker.equipment, offense_attr)
+    equipment_defense = getattr(target.equipment, defense_attr)
   else:
     equipment_offense = 0
     equipment_defense = 0
@@ -100,16 +119,111 @@ def attack(realm, attacker, target, skill_fn):
   defense = skill_defense + equipment_defense
   min_damage_prop = config.COMBAT_MINIMUM_DAMAGE_PROPORTION
   damage  = config.COMBAT_DAMAGE_FORMULA(offense, defense, multiplier, min_damage_prop)
-  damage  = max(int(damage), 0)
+  return max(int(damage), 0)
+
+def batch_formula(formula):
+  '''Array version of the config damage formula before the int conversion, if any'''
+  from nmmo.core import config as nmmo_config
+  func = getattr(formula, '__func__', formula)
+  if func is nmmo_config.original_combat_damage_formula:
+    return lambda offense, defense, multiplier, min_prop: \
+      multiplier * (offense * (15 / (15 + defense)))
+  if func is nmmo_config.alt_combat_damage_formula:
+    return lambda offense, defense, multiplier, min_prop: \
+      np.maximum(multiplier * offense - defense, offense * min_prop)
+  return None
+
+def batch_damage(realm, attackers, targets, skills):
+  '''Damage of many attacks at once, the same as attack_damage() for each attack.
+  Skill levels are read from the Entity table'''
+  from nmmo.entity.entity import EntityState
+  config = realm.config
+  if not attackers:
+    return np.zeros(0, dtype=np.int64)
+
+  style_skills = [Skill.Melee, Skill.Range, Skill.Mage]
+  style = np.array([style_skills.index(type(skill)) for skill in skills])
+  weakness = np.array([style_skills.index(skill.weakness) for skill in style_skills])
+  names = [name.upper() for name in STYLE_NAMES]
+  if config.PROGRESSION_SYSTEM_ENABLED:
+    base_damage = np.array([getattr(config, f'PROGRESSION_{n}_BASE_DAMAGE') for n in names])
+    level_damage = np.array([getattr(config, f'PROGRESSION_{n}_LEVEL_DAMAGE') for n in names])
+  else:
+    base_damage = np.array([getattr(config, f'COMBAT_{n}_DAMAGE') for n in names])
+    level_damage = np.zeros(len(names), dtype=np.int64)
+
+  cols = EntityState.State.attr_name_to_col
+  table = EntityState.State.table(realm.datastore)
+  attacker_rows = np.array([ent.datastore_record.id for ent in attackers])
+  target_rows = np.array([ent.datastore_record.id for ent in targets])
+  attacker_is_player = np.array([ent.is_player for ent in attackers])
+  attacker_is_npc = np.array([ent.is_npc for ent in attackers])
+  target_is_player = np.array([ent.is_player for ent in targets])
+
+  # Multiplier of the style that is the weakness of the target's highest-exp style
+  # NOTE: exp is unbounded, so read it from the entities rather than the int16 table
+  exp = np.array([[skill.exp.val for skill in (ent.skills.melee, ent.skills.range,
+                                               ent.skills.mage)] for ent in targets])
+  weak = (exp.max(axis=1) != exp.min(axis=1)) & (weakness[exp.argmax(axis=1)] == style)
+  multiplier = np.where(weak, config.COMBAT_WEAKNESS_MULTIPLIER, 1.0)
 
-  if attacker.is_player:
-    realm.event_log.record(EventCode.SCORE_HIT, attacker, target=target,
-                           combat_style=skill_type, damage=damage)
+  # NOTE: skill offense and defense are only for agents, NOT npcs
+  level_cols = np.array([cols[f'{name}_level'] for name in STYLE_NAMES])
+  skill_level = table.get_column(attacker_rows, level_cols[style]).astype(np.int64)
+  skill_offense = base_damage[style] + np.where(attacker_is_player,
+                                                level_damage[style] * skill_level, 0)
+  if config.EQUIPMENT_SYSTEM_ENABLED:
+    skill_offense = np.where(attacker_is_npc, 0, skill_offense)
 
-  attacker.apply_damage(damage, skill.__class__.__name__.lower())
-  target.receive_damage(attacker, damage)
+  skill_defense = np.zeros(len(targets), dtype=np.int64)
+  if config.PROGRESSION_SYSTEM_ENABLED:
+    levels = table.get(target_rows)[:, [cols[f'{name}_level'] for name in LEVEL_SKILLS]]
+    skill_defense = np.where(target_is_player, config.PROGRESSION_BASE_DEFENSE +
+                             config.PROGRESSION_LEVEL_DEFENSE*levels.max(axis=1), 0)
 
-  return damage
+  offense, defense = skill_offense, skill_defense
+  if config.EQUIPMENT_SYSTEM_ENABLED:
+    offense = offense + np.array([getattr(ent.equipment, f'{STYLE_NAMES[idx]}_attack')
+                                  for ent, idx in zip(attackers, style)])
+    defense = defense + np.array([getattr(ent.equipment, f'{STYLE_NAMES[idx]}_defense')
+                                  for ent, idx in zip(targets, style)])
+
+  # Total damage calculation, with the config formula for each attack if it has no array version
+  min_damage_prop = config.COMBAT_MINIMUM_DAMAGE_PROPORTION
+  formula = config.COMBAT_DAMAGE_FORMULA
+  array_formula = batch_formula(formula)
+  if array_formula is None:
+    return np.array([max(int(formula(off, dfn, mul, min_damage_prop)), 0) for off, dfn, mul
+                     in zip(offense.tolist(), defense.tolist(), multiplier.tolist())])
+  damage = np.trunc(array_formula(offense, defense, multiplier, min_damage_prop))
+  return np.maximum(damage, 0).astype(np.int64)
+
+def resolve_attacks(realm, attacks):
+  '''Attack actions of a tick, as the (ent_id, (Attack, args)) of realm.step in order
+
+  The damage of all attacks is computed at once from the state before the attacks,
+  and then the attacks are applied in order with Attack.call. An entity that attacked
+  earlier may have leveled up or fired its ammunition, so the attacks on it are recomputed'''
+  calls, attackers, targets, skills = [], [], [], []
+  for ent_id, (atn, args) in attacks:
+    entity = realm.entity(ent_id)
+    style, target = args
+    idx = None
+    if style is not None and target is not None and entity.alive:
+      idx = len(attackers)
+      attackers.append(entity)
+      targets.append(target)
+      skills.append(style.skill(entity))
+    calls.append((entity, atn, style, target, idx))
+
+  damage = batch_damage(realm, attackers, targets, skills).tolist()
+  attacked = set()
+  for entity, atn, style, target, idx in calls:
+    if not entity.alive or entity.status.frozen:
+      continue
+    dmg = None if idx is None or target.ent_id in attacked else damage[idx]
+    if atn.call(realm, entity, style, target, dmg) is not None:
+      attacked.add(entity.ent_id)
 
 
 def danger(config, pos):
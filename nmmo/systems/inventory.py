@@ -4,24 +4,36 @@ from ordered_set import OrderedSet
 
 from nmmo.systems import item as Item
 class EquipmentSlot:
-  def __init__(self) -> None:
+  def __init__(self, equipment=None) -> None:
     self.item = None
+    self.equipment = equipment
 
   def equip(self, item: Item.Item) -> None:
     self.item = item
+    self._invalidate()
 
   def unequip(self) -> None:
     if self.item:
       self.item.equipped.update(0)
     self.item = None
+    self._invalidate()
+
+  def _invalidate(self):
+    if self.equipment is not None:
+      self.equipment.invalidate()
 
 class Equipment:
+  # Item attributes summed over the equipped items
+  AGGREGATES = ('level', 'melee_attack', 'range_attack', 'mage_attack',
+                'melee_defense', 'range_defense', 'mage_defense')
+
   def __init__(self):
-    self.hat = EquipmentSlot()
-    self.top = EquipmentSlot()
-    self.bottom = EquipmentSlot()
-    self.held = EquipmentSlot()
-    self.ammunition = EquipmentSlot()
+    self.hat = EquipmentSlot(self)
+    self.top = EquipmentSlot(self)
+    self.bottom = EquipmentSlot(self)
+    self.held = EquipmentSlot(self)
+    self.ammunition = EquipmentSlot(self)
+    self._totals = None
 
   def total(self, lambda_getter):
     items = [lambda_getter(e).val for e in self]
@@ -29,6 +41,16 @@ class Equipment:
       return 0
     return sum(items)
 
+  def invalidate(self):
+    '''Called by the slots on equip/unequip. Item stats do not change once created,
+    and ammunition that runs out is removed, i.e. unequipped'''
+    self._totals = None
+
+  def _total(self, attr):
+    if self._totals is None:
+      self._totals = {name: sum(getattr(e, name).val for e in self) for name in self.AGGREGATES}
+    return self._totals[attr]
+
   def __iter__(self):
     for slot in [self.hat, self.top, self.bottom, self.held, self.ammunition]:
       if slot.item is not None:
@@ -40,31 +62,31 @@ class Equipment:
 
   @property
   def item_level(self):
-    return self.total(lambda e: e.level)
+    return self._total('level')
 
   @property
   def melee_attack(self):
-    return self.total(lambda e: e.melee_attack)
+    return self._total('melee_attack')
 
   @property
   def range_attack(self):
-    return self.total(lambda e: e.range_attack)
+    return self._total('range_attack')
 
   @property
   def mage_attack(self):
-    return self.total(lambda e: e.mage_attack)
+    return self._total('mage_attack')
 
   @property
   def melee_defense(self):
-    return self.total(lambda e: e.melee_defense)
+    return self._total('melee_defense')
 
   @property
   def range_defense(self):
-    return self.total(lambda e: e.range_defense)
+    return self._total('range_defense')
 
   @property
   def mage_defense(self):
-    return self.total(lambda e: e.mage_defense)
+    return self._total('mage_defense')
 
   @property
   def packet(self):
@@ -5,7 +5,7 @@ from abc import ABC
 from types import SimpleNamespace
 from typing import Dict
 
-from nmmo.datastore.serialized import SerializedState
+from nmmo.datastore.serialized import SerializedState, StatePool
 from nmmo.lib.colors import Tier
 from nmmo.lib.event_code import EventCode
 
@@ -70,6 +70,10 @@ class Item(ItemState):
   ITEM_TYPE_ID = None
   _item_type_id_to_class: Dict[int, type] = {}
 
+  def __new__(cls, *args, **kwargs):
+    # Reuse a destroyed item with config.POOL_OBJECTS. __init__ re-initializes it
+    return StatePool.new(cls, args[0] if args else kwargs.get("realm"))
+
   @staticmethod
   def register(item_type):
     assert item_type.ITEM_TYPE_ID is not None
@@ -113,10 +117,14 @@ class Item(ItemState):
     #   and see how many high-level items are wasted
     if self.config.EXCHANGE_SYSTEM_ENABLED:
       self.realm.exchange.unlist_item(self)
-    if self.owner_id.val in self.realm.players:
-      self.realm.players[self.owner_id.val].inventory.remove(self)
+    # Players and NPCs alike, which also unequips the item
+    owner = self.realm.entity_or_none(self.owner_id.val) if self.owner_id.val else None
+    if owner is not None and self in owner.inventory.items:
+      owner.inventory.remove(self)
     self.realm.items.pop(self.id.val, None)
     self.datastore_record.delete()
+    if getattr(self.realm, "pool", None) is not None:
+      self.realm.pool.release(self)
 
   @property
   def packet(self):
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import abc
+from bisect import bisect_right
 
 import numpy as np
 from ordered_set import OrderedSet
@@ -18,7 +19,10 @@ class ExperienceCalculator:
     self.exp_threshold = np.array(config.PROGRESSION_EXP_THRESHOLD)
     assert len(self.exp_threshold) >= config.PROGRESSION_LEVEL_MAX,\
       "PROGRESSION_LEVEL_BY_EXP must have at least PROGRESSION_LEVEL_MAX entries"
+    assert np.all(np.diff(self.exp_threshold) >= 0),\
+      "PROGRESSION_EXP_THRESHOLD must be in increasing order"
     self.max_exp = self.exp_threshold[self.config.PROGRESSION_LEVEL_MAX - 1]
+    self._thresholds = self.exp_threshold.tolist()  # for bisect
 
   def exp_at_level(self, level):
     level = min(max(level, self.config.PROGRESSION_BASE_LEVEL),
@@ -28,7 +32,43 @@ class ExperienceCalculator:
   def level_at_exp(self, exp):
     if exp >= self.max_exp:
       return self.config.PROGRESSION_LEVEL_MAX
-    return np.argmin(exp >= self.exp_threshold)
+    # the number of thresholds reached, i.e., the index of the first one above exp
+    return bisect_right(self._thresholds, exp)
+
+  def levels_at_exp(self, exp):
+    '''level_at_exp() of an array of exp'''
+    levels = np.searchsorted(self.exp_threshold, exp, side="right")
+    return np.minimum(levels, self.config.PROGRESSION_LEVEL_MAX)
+
+def add_xp(realm, ent_ids, skill_name, xp):
+  '''Skill.add_xp() of the skill_name skill of many entities at once
+
+  xp is an array with one value per entity, or a single value for all. The level
+  columns are updated in bulk, and LEVEL_UP is recorded for the entities that
+  leveled up. The exp values are kept by the entities, since they are unbounded
+
+  The game loop grants xp one event at a time, in action order, since a level up
+  changes the damage of the later attacks of the tick. This is for callers that
+  grant xp to many entities at once'''
+  from nmmo.entity.entity import EntityState
+  ent_ids = np.asarray(ent_ids)
+  assert len(np.unique(ent_ids)) == len(ent_ids), "Entity ids must be unique"
+  if len(ent_ids) == 0:
+    return
+
+  skills = [getattr(realm.entity(ent_id).skills, skill_name) for ent_id in ent_ids.tolist()]
+  xp = np.broadcast_to(xp, ent_ids.shape).tolist()
+  exp = np.array([skill.exp.increment(amount).val for skill, amount in zip(skills, xp)])
+  new_levels = skills[0].experience_calculator.levels_at_exp(exp)
+
+  table = EntityState.State.table(realm.datastore)
+  rows = np.array([skill.entity.datastore_record.id for skill in skills])
+  level_col = EntityState.State.attr_name_to_col[f"{skill_name}_level"]
+  leveled_up = np.flatnonzero(new_levels > table.get_column(rows, level_col))
+  table.set_column(rows[leveled_up], level_col, new_levels[leveled_up])
+  for idx in leveled_up.tolist():
+    realm.event_log.record(EventCode.LEVEL_UP, skills[idx].entity,
+                           skill=skills[idx], level=int(new_levels[idx]))
 
 class SkillGroup:
   def __init__(self, realm, entity):
@@ -68,7 +108,7 @@ class Skill(abc.ABC):
 
   def add_xp(self, xp):
     self.exp.increment(xp)
-    new_level = int(self.experience_calculator.level_at_exp(self.exp.val))
+    new_level = self.experience_calculator.level_at_exp(self.exp.val)
 
     if new_level > self.level.val:
       self.level.update(new_level)
@@ -135,7 +175,7 @@ class HarvestSkill(NonCombatSkill):
     realm  = self.realm
 
     r, c = entity.pos
-    if realm.map.tiles[r, c].state != matl:
+    if realm.map.state_map[r, c] != matl.index:
       return False
 
     drop_table = realm.map.harvest(r, c, deplete)
@@ -151,14 +191,15 @@ class HarvestSkill(NonCombatSkill):
     r, c      = entity.pos
     drop_table = None
 
-    if realm.map.tiles[r-1, c].state == matl:
-      drop_table = realm.map.harvest(r-1, c, deplete)
-    if realm.map.tiles[r+1, c].state == matl:
-      drop_table = realm.map.harvest(r+1, c, deplete)
-    if realm.map.tiles[r, c-1].state == matl:
-      drop_table = realm.map.harvest(r, c-1, deplete)
-    if realm.map.tiles[r, c+1].state == matl:
-      drop_table = realm.map.harvest(r, c+1, deplete)
+    # Most entities are not next to the material, which the adjacency grid tells at once
+    adjacent = realm.map.adjacent.get(matl.index)
+    if adjacent is not None and adjacent[r, c] == 0:
+      return drop_table
+
+    state_map = realm.map.state_map
+    for dr, dc in realm.map.NEIGHBOURS:
+      if state_map[r+dr, c+dc] == matl.index:
+        drop_table = realm.map.harvest(r+dr, c+dc, deplete)
 
     if drop_table:
       self.process_drops(matl, drop_table)
@@ -239,7 +280,11 @@ class Combat(SkillGroup):
     pass
 
 class Skills(Basic, Harvest, Combat):
-  pass
+  def update(self, basic=True):
+    # basic=False skips water and food, which are depleted for all players at once
+    for skill in self.skills:
+      if basic or skill not in (self.water, self.food):
+        skill.update()
 
 ### Combat Skills ###
 class Melee(CombatSkill):
@@ -298,16 +343,13 @@ class Water(HarvestSkill):
     if config.IMMORTAL or self.entity.immortal:
       return
 
-    depletion = config.RESOURCE_DEPLETION_RATE
-    water = self.entity.resources.water
-    water.decrement(depletion)
+    resources = self.entity.resources
+    resources.water.update(float(resources.deplete(config, resources.water.val)))
 
     if not self.harvest_adjacent(material.Water, deplete=False):
       return
 
-    restore = np.floor(config.RESOURCE_BASE
-                      * config.RESOURCE_HARVEST_RESTORE_FRACTION)
-    water.increment(restore)
+    resources.water.update(float(resources.restore(config, resources.water.val)))
 
     self.realm.event_log.record(EventCode.DRINK_WATER, self.entity)
 
@@ -320,16 +362,16 @@ class Food(HarvestSkill):
     if config.IMMORTAL or self.entity.immortal:
       return
 
-    depletion = config.RESOURCE_DEPLETION_RATE
-    food = self.entity.resources.food
-    food.decrement(depletion)
+    resources = self.entity.resources
+    resources.food.update(float(resources.deplete(config, resources.food.val)))
+    self.eat()
 
+  def eat(self):
     if not self.harvest(material.Foilage):
       return
 
-    restore = np.floor(config.RESOURCE_BASE
-                      * config.RESOURCE_HARVEST_RESTORE_FRACTION)
-    food.increment(restore)
+    resources = self.entity.resources
+    resources.food.update(float(resources.restore(self.config, resources.food.val)))
 
     self.realm.event_log.record(EventCode.EAT_FOOD, self.entity)
 
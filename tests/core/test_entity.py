@@ -2,9 +2,14 @@ import unittest
 import numpy as np
 
 import nmmo
+from nmmo.core import action as Action
 from nmmo.entity.entity import Entity, EntityState
+from nmmo.entity.npc import Equipment
 from nmmo.datastore.numpy_datastore import NumpyDatastore
-from scripted.baselines import Random
+from nmmo.lib.event_code import EventCode
+from nmmo.systems.item import Hat, ItemState
+from tests.testhelpers import observations_are_equal
+from scripted.baselines import Fisher, Forage, Mage, Melee, Prospector, Random, Range
 
 
 class MockRealm:
@@ -15,7 +20,7 @@ class MockRealm:
     self.datastore.register_object_type("Entity", EntityState.State.num_attributes)
     self._np_random = np.random
 
-# pylint: disable=no-member
+# pylint: disable=no-member,protected-access
 class TestEntity(unittest.TestCase):
   def test_entity(self):
     realm = MockRealm()
@@ -90,5 +95,310 @@ class TestEntity(unittest.TestCase):
     # pylint:disable=protected-access
     self.assertEqual(player1._make_mortal_tick, env.realm.tick + 10)
 
+  def test_batched_counters(self):
+    def scalar_counters(group):
+      # Per-entity updates that EntityGroup.update() replaces with column operations
+      for ent in group.entities.values():
+        if ent.history.damage == 0:
+          ent.attacker = None
+          ent.attacker_id.update(0)
+        if ent.status.frozen:
+          ent.status.freeze.decrement(1)
+        ent.history.damage.update(0)
+        ent.history.time_alive.increment()
+
+    def run_env(batched):
+      config = nmmo.config.Default()
+      config.set("PLAYERS", [Melee, Range, Mage])
+      env = nmmo.Env(config, seed=0)
+      env.reset(seed=0)
+      env.realm.players[1].make_recon()  # frozen
+      if not batched:
+        for group in [env.realm.players, env.realm.npcs]:
+          group._update_counters = lambda group=group: scalar_counters(group)
+      for _ in range(64):
+        env.step({})
+      return env
+
+    batched, scalar = run_env(True), run_env(False)
+    self.assertListEqual(list(batched.realm.players), list(scalar.realm.players))
+    self.assertListEqual(list(batched.realm.npcs), list(scalar.realm.npcs))
+    self.assertTrue(np.array_equal(EntityState.Query.table(batched.realm.datastore),
+                                   EntityState.Query.table(scalar.realm.datastore)))
+    self.assertTrue(any(ent.attacker is not None for ent in batched.realm.npcs.values()))
+    for ent_id, ent in batched.realm.npcs.items():
+      self.assertEqual(ent.attacker is None, scalar.realm.npcs[ent_id].attacker is None)
+
+  def test_batched_resources(self):
+    def scalar_update(group, actions):
+      # Per-player resource, food and water updates, as in Player.update()
+      group._update_counters()
+      for player in group.entities.values():
+        player.update(group.realm, actions)
+
+    def run_env(batched, health_increment):
+      config = nmmo.config.Default()
+      config.set("PLAYERS", [Forage, Random])
+      config.set("RESOURCE_RESILIENT_POPULATION", 0.5)
+      config.set("PLAYER_HEALTH_INCREMENT", health_increment)
+      env = nmmo.Env(config, seed=0)
+      env.reset(seed=0)
+      env.realm.players[2]._set_immortal(duration=10)
+      if not batched:
+        players = env.realm.players
+        players.update = lambda actions: scalar_update(players, actions)
+      for tick in range(128):
+        if tick == 64:  # the flag of a live player can change
+          for player in env.realm.players.values():
+            player.resources.resilient = not player.resources.resilient
+        env.step({})
+      return env
+
+    # PLAYER_HEALTH_INCREMENT is 0 by default
+    for health_increment in [0, 1]:
+      batched, scalar = run_env(True, health_increment), run_env(False, health_increment)
+      self.assertTrue(len(batched.realm.players) < batched.config.PLAYER_N)  # some starved
+      self.assertListEqual(list(batched.realm.players), list(scalar.realm.players))
+      self.assertTrue(np.array_equal(EntityState.Query.table(batched.realm.datastore),
+                                     EntityState.Query.table(scalar.realm.datastore)))
+      self.assertTrue(np.array_equal(batched.realm.map.state_map, scalar.realm.map.state_map))
+
+      self.assertTrue(np.array_equal(batched.realm.event_log.get_data(),
+                                     scalar.realm.event_log.get_data()))
+      for code in [EventCode.EAT_FOOD, EventCode.DRINK_WATER]:
+        self.assertTrue(len(batched.realm.event_log.get_data(event_code=code)) > 0)
+
+  def test_batched_starvation_and_regen(self):
+    # Default config, against the scalar Resources.update() of each player
+    config = nmmo.config.Default()
+    config.set("PLAYERS", [Random])
+    env = nmmo.Env(config, seed=0)
+    env.reset(seed=0)
+    players = env.realm.players
+    starving, healing = players[1], players[2]
+    starving.resources.food.update(0)
+    starving.resources.water.update(0)
+    healing.resources.health.update(50)
+
+    expected = {}
+    for player in [starving, healing]:
+      health, food, water = (player.resources.health.val, player.resources.food.val,
+                             player.resources.water.val)
+      player.resources.update(player.immortal)
+      expected[player.ent_id] = player.resources.health.val
+      player.resources.health.update(health)
+      player.resources.food.update(food)
+      player.resources.water.update(water)
+
+    players._update_resources([starving, healing],
+                              players.row_ids[[list(players).index(1), list(players).index(2)]])
+    self.assertEqual(starving.resources.health.val, expected[1])
+    self.assertTrue(starving.resources.health.val < config.PLAYER_BASE_HEALTH)
+    self.assertEqual(healing.resources.health.val, expected[2])
+    self.assertTrue(healing.resources.health.val > 50)
+
+  def test_cull_by_health_column(self):
+    config = nmmo.config.Default()
+    config.set("PLAYERS", [Melee, Range, Mage])
+    env = nmmo.Env(config, seed=0)
+    env.reset(seed=0)
+
+    # Kill some players out of order, the dead are culled in the order of the group
+    for ent_id in [7, 3, 5]:
+      env.realm.players[ent_id].resources.health.update(0)
+    dead = env.realm.players.cull()
+    self.assertListEqual(list(dead), [3, 5, 7])
+    for ent_id in dead:
+      self.assertNotIn(ent_id, env.realm.players)
+      self.assertNotIn(ent_id, EntityState.Query.table(env.realm.datastore)[:, 0])
+    self.assertDictEqual(env.realm.players.cull(), {})
+
+    # Same as checking ent.alive for every entity
+    culled = []
+    def check_cull(group, cull):
+      expected = [ent_id for ent_id, ent in group.items() if not ent.alive]
+      dead = cull()
+      self.assertListEqual(list(dead), expected)
+      culled.extend(expected)
+      return dead
+    for group in [env.realm.players, env.realm.npcs]:
+      group.cull = lambda group=group, cull=group.cull: check_cull(group, cull)
+    for _ in range(64):
+      env.step({})
+    self.assertTrue(len(culled) > 0)
+
+  def test_pooled_objects(self):
+    def run_env(pool):
+      config = nmmo.config.Default()
+      config.set("PLAYERS", [Melee, Range, Mage, Forage, Fisher, Prospector])
+      config.set("POOL_OBJECTS", pool)
+      env = nmmo.Env(config, seed=0)
+      players = []  # of each episode, at reset
+      for seed in range(2):
+        obs = env.reset(seed=seed)
+        players.append(list(env.realm.players.values()))
+        for _ in range(32):
+          obs, *_ = env.step({})
+      return env, obs, players
+
+    (pooled, pooled_obs, pooled_players), (fresh, fresh_obs, fresh_players) = \
+      run_env(True), run_env(False)
+    self.assertListEqual(list(pooled.realm.players), list(fresh.realm.players))
+    for ent_id, ent in pooled.realm.players.items():
+      self.assertDictEqual(ent.packet(), fresh.realm.players[ent_id].packet())
+    for query in [EntityState.Query.table, ItemState.Query.table]:
+      self.assertTrue(np.array_equal(query(pooled.realm.datastore), query(fresh.realm.datastore)))
+    self.assertTrue(np.array_equal(pooled.realm.event_log.get_data(),
+                                   fresh.realm.event_log.get_data()))
+    self.assertTrue(observations_are_equal(pooled_obs, fresh_obs))
+
+    # The players of the first episode were recycled, and so were the destroyed items
+    self.assertSetEqual({id(ent) for ent in pooled_players[0]},
+                        {id(ent) for ent in pooled_players[1]})
+    self.assertFalse({id(ent) for ent in fresh_players[0]} & {id(ent) for ent in fresh_players[1]})
+    self.assertTrue(len(pooled.realm.pool) > 0)
+    self.assertIsNone(fresh.realm.pool)
+
+  def test_destroyed_items_leave_owners(self):
+    config = nmmo.config.Default()
+    config.set("PLAYERS", [Random])
+    config.set("POOL_OBJECTS", True)
+    env = nmmo.Env(config, seed=0)
+    env.reset(seed=0)
+    realm = env.realm
+
+    player = realm.players[1]
+    hat = Hat(realm, 1)
+    player.inventory.receive(hat)
+    hat.use(player)
+    self.assertIs(player.inventory.equipment.hat.item, hat)
+    hat.destroy()
+    self.assertNotIn(hat, player.inventory.items)
+    self.assertIsNone(player.inventory.equipment.hat.item)
+
+    # NPCs do not pick up items, but can own them
+    npc = next(iter(realm.npcs.values()))
+    hat = Hat(realm, 1)
+    hat.owner_id.update(npc.id.val)
+    npc.inventory.items.add(hat)
+    hat.destroy()
+    self.assertNotIn(hat, npc.inventory.items)
+
+    # Items of culled entities are taken off them before they are pooled
+    player = realm.players[2]
+    hat = Hat(realm, 1)
+    player.inventory.receive(hat)
+    hat.use(player)
+    player.resources.health.update(0)
+    self.assertIn(player.ent_id, realm.players.cull())
+    self.assertEqual(len(player.inventory.items), 0)
+    self.assertIsNone(player.inventory.equipment.hat.item)
+
+  def test_batched_npc_decisions(self):
+    def action_ids(actions):
+      # Target entities by id, to compare across envs
+      return {ent_id: {atn: {arg: getattr(val, "ent_id", val) for arg, val in args.items()}
+                       for atn, args in ent_actions.items()}
+              for ent_id, ent_actions in actions.items()}
+
+    def make_env(batched, allow_attack_npcs):
+      config = nmmo.config.Default()
+      config.set("PLAYERS", [Melee, Range, Mage, Random])
+      config.set("NPC_SPAWN_AGGRESSIVE", 0.3)
+      config.set("NPC_ALLOW_ATTACK_OTHER_NPCS", allow_attack_npcs)
+      config.set("NPC_BATCH_DECISIONS", batched)
+      env = nmmo.Env(config, seed=0)
+      env.reset(seed=0)
+      np_random = np.random.default_rng(0)
+      for _ in range(16):  # soldiers rally toward the center
+        r, c = np_random.integers(20, 120, 2)
+        npc = env.realm.npcs.spawn_npc(int(r), int(c), order={"rally": (80, 80)})
+        if npc:
+          npc.equipment = Equipment(0, 0, 0, 0, 0, 0, 0)
+
+      npcs, actions = env.realm.npcs, []
+      npc_actions = npcs.actions
+      def record_actions():
+        actions.append(npc_actions())
+        return actions[-1]
+      npcs.actions = record_actions
+      return env, actions
+
+    for allow_attack_npcs in [False, True]:
+      (batched, batched_actions), (per_npc, per_npc_actions) = \
+        make_env(True, allow_attack_npcs), make_env(False, allow_attack_npcs)
+      for _ in range(64):
+        batched.step({})
+        per_npc.step({})
+        self.assertDictEqual(action_ids(batched_actions[-1]), action_ids(per_npc_actions[-1]))
+      self.assertTrue(np.array_equal(EntityState.Query.table(batched.realm.datastore),
+                                     EntityState.Query.table(per_npc.realm.datastore)))
+      self.assertTrue(any(Action.Attack in atn for tick_actions in batched_actions
+                          for atn in tick_actions.values()))
+
+  def test_npc_level_of_detail(self):
+    def make_env(lod_enabled, radius):
+      config = nmmo.config.Default()
+      config.set("PLAYERS", [Forage, Fisher])
+      config.set("NPC_LOD_ENABLED", lod_enabled)
+      config.set("NPC_LOD_RADIUS", radius)
+      config.set("NPC_LOD_INTERVAL", 4)
+      env = nmmo.Env(config, seed=0)
+      env.reset(seed=0)
+      return env
+
+    # Every NPC is near a player, so the simulation is the same as without LOD
+    full, lod = make_env(False, 0), make_env(True, 1024)
+    for _ in range(32):
+      full.step({})
+      lod.step({})
+      self.assertEqual(lod.realm.npcs.lod_counts["idle"], 0)
+    self.assertTrue(np.array_equal(EntityState.Query.table(full.realm.datastore),
+                                   EntityState.Query.table(lod.realm.datastore)))
+
+    # No NPC is near a player: each one is updated every 4 ticks
+    env = make_env(True, -1)
+    npcs = env.realm.npcs
+    tracked = dict(npcs.items())
+    for npc in tracked.values():
+      npc.resources.health.update(50)
+    for _ in range(4):
+      env.step({})
+
+    # The first update counts the ticks since the spawn
+    for ent_id, npc in tracked.items():
+      if npc.alive:
+        self.assertEqual(npc.resources.health.val, 51 + npcs._last_update[ent_id])
+        npc.resources.health.update(50)
+
+    for _ in range(4):
+      pos = {ent_id: npc.pos for ent_id, npc in npcs.items()}
+      env.step({})
+      counts = npcs.lod_counts
+      self.assertEqual(counts["near"], 0)
+      self.assertEqual(counts["far"] - counts["idle"], len(npcs._active))
+      self.assertTrue(0 < counts["idle"] < counts["far"])
+      for ent_id, npc in npcs.items():
+        if ent_id in pos and ent_id not in npcs._active:
+          self.assertEqual(npc.pos, pos[ent_id])  # idle NPCs do not move
+
+    # The health regen of the skipped ticks is caught up on the next update
+    for ent_id, npc in tracked.items():
+      if npc.alive:
+        self.assertEqual(npc.resources.health.val, 54)
+
+    # Same when the far NPCs start taking turns mid-episode
+    full.config.NPC_LOD_RADIUS = -1
+    full.config.NPC_LOD_ENABLED = True
+    tracked, start = dict(full.realm.npcs.items()), full.realm.tick
+    for npc in tracked.values():
+      npc.resources.health.update(50)
+    for _ in range(4):
+      full.step({})
+    for ent_id, npc in tracked.items():
+      if npc.alive:
+        self.assertEqual(npc.resources.health.val,
+                         51 + full.realm.npcs._last_update[ent_id] - start)
+
 if __name__ == '__main__':
   unittest.main()
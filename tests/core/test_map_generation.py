@@ -2,10 +2,14 @@
 import unittest
 import os
 import shutil
+import tempfile
 import numpy as np
+from imageio.v2 import imread
 
 import nmmo
-from nmmo.lib import material
+from nmmo.core import map_pack, terrain
+from nmmo.core.map_cache import MAP_CACHE
+from nmmo.lib import material, seeding
 
 
 class TestMapGeneration(unittest.TestCase):
@@ -49,8 +53,13 @@ class TestMapGeneration(unittest.TestCase):
     shutil.rmtree(path_maps, ignore_errors=True)
 
     nmmo.Env(config)
+    self.assertTrue(os.path.exists(os.path.join(path_maps, 'map1/map.png')))
 
-    # this should finish without error
+    config = MapConfig()
+    config.set("MAP_PREVIEW_FAST", True)
+    nmmo.Env(config)
+    map_size = config.MAP_SIZE - 2*config.MAP_BORDER + 1
+    self.assertEqual(imread(os.path.join(path_maps, 'map1/map.png')).shape, (map_size, map_size, 3))
 
   def test_map_reset_from_fractal(self):
     class MapConfig(
@@ -134,5 +143,189 @@ class TestMapGeneration(unittest.TestCase):
 
     # this should finish without error
 
+  def test_map_cache(self):
+    config = nmmo.config.Small()
+    config.set("PATH_MAPS", "maps/test_map_cache")
+    config.set("MAP_N", 2)
+    config.set("MAP_CACHE_MMAP", True)
+
+    path_maps = os.path.join(config.PATH_CWD, config.PATH_MAPS)
+    shutil.rmtree(path_maps, ignore_errors=True)
+    test_env = nmmo.Env(config)
+    map_file = os.path.join(path_maps, config.PATH_MAP_SUFFIX.format(1))
+
+    MAP_CACHE.clear()
+    map_dict = test_env._load_map_file(1)
+    cached = MAP_CACHE.load(map_file, config.MAP_CACHE_SIZE, mmap=True)
+    self.assertIsInstance(cached, np.memmap)
+    self.assertFalse(cached.flags.writeable)
+    self.assertTrue(np.array_equal(map_dict["map"], np.load(map_file)))
+
+    # the loaded map is a private copy, so processing it does not touch the cache
+    self.assertTrue(map_dict["map"].flags.writeable)
+    map_dict["map"][:] = material.Void.index
+    self.assertIs(MAP_CACHE.load(map_file, config.MAP_CACHE_SIZE, mmap=True), cached)
+    self.assertTrue(np.array_equal(cached, np.load(map_file)))
+
+    # regenerated maps invalidate the cached entry
+    nmmo.core.terrain.Save.as_numpy(np.zeros((4, 4)), os.path.dirname(map_file))
+    self.assertTrue(np.array_equal(test_env._load_map_file(1)["map"], np.zeros((4, 4))))
+
+    # the cache is bounded
+    MAP_CACHE.load(map_file, 1)
+    self.assertEqual(len(MAP_CACHE), 1)
+
+  def test_map_pack(self):
+    class MapConfig(nmmo.config.Small, nmmo.config.Terrain,
+                    nmmo.config.Item, nmmo.config.Profession):
+      PATH_MAPS = 'maps/test_map_pack'
+      MAP_N = 3
+      MAP_RESET_FROM_FRACTAL = True
+    config = MapConfig()
+    path_maps = os.path.join(config.PATH_CWD, config.PATH_MAPS)
+    shutil.rmtree(path_maps, ignore_errors=True)
+
+    # Generate the maps in the directory layout, then convert them
+    dir_env = nmmo.Env(config, seed=1)
+    pack_file = map_pack.from_directory(config)
+    self.assertTrue(map_pack.is_valid(pack_file, config.MAP_N, config.MAP_SIZE))
+    self.assertFalse(map_pack.is_valid(pack_file, config.MAP_N+1, config.MAP_SIZE))
+
+    pack_config = MapConfig()
+    pack_config.set("MAP_PACK", True)
+    pack_config.set("MAP_FORCE_GENERATION", False)
+    pack_env = nmmo.Env(pack_config, seed=1)  # uses the converted pack
+    for map_id in range(1, config.MAP_N+1):
+      dir_maps = dir_env._load_map_file(map_id)
+      pack_maps = pack_env._load_map_file(map_id)
+      self.assertTrue(np.array_equal(dir_maps["map"], pack_maps["map"]))
+      self.assertTrue(np.array_equal(dir_maps["fractal"], pack_maps["fractal"]))
+
+    # Generating directly into a pack gives the same maps
+    shutil.rmtree(path_maps, ignore_errors=True)
+    gen_config = MapConfig()
+    gen_config.set("MAP_PACK", True)
+    gen_env = nmmo.Env(gen_config, seed=1)
+    self.assertFalse(os.path.exists(os.path.join(path_maps, 'map1')))
+    for map_id in range(1, config.MAP_N+1):
+      self.assertTrue(np.array_equal(gen_env._load_map_file(map_id)["map"],
+                                     pack_env._load_map_file(map_id)["map"]))
+    gen_env.reset(seed=1)
+
+    # Maps are written one at a time into the preallocated file, in any order
+    pack_file = os.path.join(path_maps, 'written.npy')
+    writer = map_pack.PackWriter(pack_file, 3, 4)
+    for idx in [2, 0, 1]:
+      writer.write(idx, np.full((4, 4), idx), np.full((4, 4), idx / 4))
+    self.assertFalse(os.path.exists(pack_file))
+    writer.close()
+    pack = map_pack.load(pack_file)
+    self.assertListEqual(pack["map"][:, 0, 0].tolist(), [0, 1, 2])
+    self.assertListEqual(pack["fractal"][:, 0, 0].tolist(), [0, 0.25, 0.5])
+    self.assertListEqual(sorted(os.listdir(path_maps)),
+                         [terrain.MAP_VERSION_FILE, config.PATH_MAP_PACK, 'written.npy'])
+
+  def test_parallel_map_generation(self):
+    class MapConfig(nmmo.config.Small, nmmo.config.Terrain,
+                    nmmo.config.Item, nmmo.config.Profession):
+      MAP_N = 4
+      MAP_PACK = True
+    packs = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:  # no stale packs from earlier runs
+      for num_workers in [1, 2]:
+        config = MapConfig()
+        config.set("PATH_MAPS", os.path.join(tmp_dir, f"parallel_gen_{num_workers}"))
+        config.set("MAP_GENERATION_WORKERS", num_workers)
+        nmmo.Env(config, seed=3)
+        packs[num_workers] = np.load(map_pack.pack_path(config))
+
+    # Per-map random streams make the output independent of the number of workers
+    sequential, parallel = packs[1], packs[2]
+    self.assertTrue(np.array_equal(sequential["map"], parallel["map"]))
+    self.assertTrue(np.array_equal(sequential["fractal"], parallel["fractal"]))
+    self.assertFalse(np.array_equal(sequential["map"][0], sequential["map"][1]))
+
+    # numpy integer seeds give the same per-map streams
+    self.assertEqual(seeding.child_np_random(np.int64(3), np.int32(1)).random(),
+                     seeding.child_np_random(3, 1).random())
+
+  def test_maps_of_older_versions_regenerated(self):
+    config = nmmo.config.Small()
+    config.set("MAP_N", 1)
+    config.set("MAP_FORCE_GENERATION", False)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      config.set("PATH_MAPS", tmp_dir)
+      map_file = os.path.join(tmp_dir, "map1", "map.npy")
+      terrain.MapGenerator(config).generate_all_maps(seed=0)
+      np.save(map_file, np.zeros((4, 4)))
+
+      # Maps of the current version are reused
+      terrain.MapGenerator(config).generate_all_maps(seed=0)
+      self.assertEqual(np.load(map_file).shape, (4, 4))
+
+      # Maps without the version, e.g. from the shared random stream, are not
+      os.remove(os.path.join(tmp_dir, terrain.MAP_VERSION_FILE))
+      terrain.MapGenerator(config).generate_all_maps(seed=0)
+      self.assertEqual(np.load(map_file).shape, (config.MAP_SIZE, config.MAP_SIZE))
+
+  def test_content_addressed_maps(self):
+    class MapConfig(nmmo.config.Small, nmmo.config.Terrain):
+      PATH_MAPS = 'maps/test_content_addressed'
+      MAP_N = 2
+      MAP_CONTENT_ADDRESSED = True
+    root = os.path.join(MapConfig.PATH_CWD, MapConfig.PATH_MAPS)
+    shutil.rmtree(root, ignore_errors=True)
+
+    env = nmmo.Env(MapConfig(), seed=1)
+    self.assertEqual(os.listdir(root), [os.path.basename(env._path_maps)])
+    map_file = os.path.join(env._path_maps, MapConfig.PATH_MAP_SUFFIX.format(1))
+    mtime = os.stat(map_file).st_mtime_ns
+
+    # The same inputs reuse the maps, even with MAP_FORCE_GENERATION
+    self.assertTrue(MapConfig().MAP_FORCE_GENERATION)
+    self.assertEqual(nmmo.Env(MapConfig(), seed=1)._path_maps, env._path_maps)
+    self.assertEqual(os.stat(map_file).st_mtime_ns, mtime)
+
+    # Unseeded envs share their maps
+    self.assertEqual(nmmo.Env(MapConfig())._path_maps, nmmo.Env(MapConfig())._path_maps)
+
+    # Changing the seed or a generation setting picks a new directory,
+    # but settings only used on reset do not
+    config = MapConfig()
+    config.set("TERRAIN_WATER", 0.4)
+    self.assertNotEqual(nmmo.Env(config, seed=1)._path_maps, env._path_maps)
+    self.assertNotEqual(nmmo.Env(MapConfig(), seed=2)._path_maps, env._path_maps)
+    config = MapConfig()
+    config.set("TERRAIN_DISABLE_STONE", True)
+    self.assertEqual(terrain.map_directory(config, 1), env._path_maps)
+
+    # Runtime settings keep the key
+    for attr, val in [("MAP_PATHFINDING_CACHE_SIZE", 16), ("MAP_FLOW_FIELD_CACHE_SIZE", 4),
+                      ("MAP_PRECOMPUTE_FLOW_FIELDS", None),
+                      ("MAP_PREVIEW_FAST", None), ("MAP_GENERATE_PREVIEWS", None),
+                      ("MAP_PREVIEW_DOWNSCALE", 2), ("TERRAIN_CHUNK_ROWS", 16),
+                      ("MAP_GENERATION_WORKERS", 2), ("MAP_CACHE_SIZE", 1)]:
+      config = MapConfig()
+      if val is None:  # toggle the flag
+        val = not getattr(config, attr)
+      self.assertNotEqual(getattr(config, attr), val)
+      config.set(attr, val)
+      self.assertEqual(terrain.map_directory(config, 1), env._path_maps)
+
+    # Generators declare the config attributes they read
+    class StoneGenerator(terrain.MapGenerator):
+      @classmethod
+      def key_attrs(cls):
+        return super().key_attrs() + ["TERRAIN_DISABLE_STONE"]
+    config = MapConfig()
+    config.set("MAP_GENERATOR", StoneGenerator)
+    stone_dir = terrain.map_directory(config, 1)
+    self.assertNotEqual(stone_dir, env._path_maps)
+    config.set("TERRAIN_DISABLE_STONE", True)
+    self.assertNotEqual(terrain.map_directory(config, 1), stone_dir)
+
+    self.assertEqual(len(os.listdir(root)), 4)  # no leftover temporary directories
+    nmmo.Env(MapConfig(), seed=1).reset(seed=1)
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,186 @@
+# pylint: disable=invalid-name
+import heapq
+import unittest
+from collections import deque
+from types import SimpleNamespace
+
+import numpy as np
+
+import nmmo
+from nmmo.lib import astar
+from nmmo.lib.utils import in_bounds
+
+
+def bfs_distance(habitable, goal):
+  dist = np.full(habitable.shape, -1)
+  dist[goal] = 0
+  queue = deque([goal])
+  while queue:
+    r, c = queue.popleft()
+    for dr, dc in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+      nxt = (r + dr, c + dc)
+      if 0 <= nxt[0] < habitable.shape[0] and 0 <= nxt[1] < habitable.shape[1] \
+         and habitable[nxt] and dist[nxt] < 0:
+        dist[nxt] = dist[r, c] + 1
+        queue.append(nxt)
+  return dist
+
+def aStar_ref(realm_map, start, goal, cutoff=astar.CUTOFF):
+  '''The dict-based A*, caching into realm_map.pathfinding_cache (a dict)'''
+  tiles = realm_map.tiles
+  if start == goal:
+    return (0, 0)
+  if (start, goal) in realm_map.pathfinding_cache:
+    return realm_map.pathfinding_cache[(start, goal)]
+  initial_goal = goal
+  pq = [(0, start)]
+
+  backtrace = {}
+  cost = {start: 0}
+
+  closestPos = start
+  closestHeuristic = astar.l1(start, goal)
+  closestCost = closestHeuristic
+
+  while pq:
+    cutoff -= 1
+    if cutoff <= 0:
+      if goal not in backtrace:
+        goal = closestPos
+      break
+
+    priority, cur = heapq.heappop(pq)
+    if cur == goal:
+      break
+
+    for nxt in astar.adjacentPos(cur):
+      if not in_bounds(*nxt, tiles.shape) or realm_map.habitable_tiles[nxt] == 0:
+        continue
+
+      newCost = cost[cur] + 1
+      if nxt not in cost or newCost < cost[nxt]:
+        cost[nxt] = newCost
+        heuristic = astar.l1(goal, nxt)
+        priority = newCost + heuristic
+        if heuristic < closestHeuristic or (
+            heuristic == closestHeuristic and priority < closestCost):
+          closestPos = nxt
+          closestHeuristic = heuristic
+          closestCost = priority
+
+        heapq.heappush(pq, (priority, nxt))
+        backtrace[nxt] = cur
+
+  while goal in backtrace and backtrace[goal] != start:
+    gr, gc = goal
+    goal = backtrace[goal]
+    sr, sc = goal
+    realm_map.pathfinding_cache[(goal, initial_goal)] = (gr - sr, gc - sc)
+
+  sr, sc = start
+  gr, gc = goal
+  realm_map.pathfinding_cache[(start, initial_goal)] = (gr - sr, gc - sc)
+  return (gr - sr, gc - sc)
+
+
+class TestPathfinding(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.config = nmmo.config.Default()
+    cls.env = nmmo.Env(cls.config, seed=0)
+    cls.env.reset(seed=0)
+
+  def test_flow_field_follows_shortest_paths(self):
+    realm_map = self.env.realm.map
+    habitable = realm_map.habitable_tiles.astype(bool)
+    rows, cols = np.nonzero(habitable)
+    goal = (rows[len(rows)//2], cols[len(cols)//2])
+
+    field = realm_map.flow_field(goal)
+    dist = bfs_distance(habitable, goal)
+    self.assertTrue(np.array_equal(field >= 0, dist > 0))
+
+    # Every step moves to a habitable tile one step closer to the goal
+    for r, c in zip(*np.nonzero(dist > 0)):
+      dr, dc = realm_map.flow_step((r, c), goal)
+      self.assertEqual(dist[r + dr, c + dc], dist[r, c] - 1)
+    self.assertEqual(realm_map.flow_step(goal, goal), (0, 0))
+    self.assertIs(realm_map.flow_field(goal), field)
+
+  def test_flow_fields_bounded(self):
+    config = nmmo.config.Default()
+    config.set("MAP_FLOW_FIELD_CACHE_SIZE", 2)
+    env = nmmo.Env(config, seed=0)
+    env.reset(seed=0)
+    realm_map = env.realm.map
+    goals = [tuple(int(x) for x in pos) for pos in np.argwhere(realm_map.habitable_tiles)[:3]]
+    fields = [realm_map.flow_field(goal) for goal in goals]
+    self.assertEqual(len(realm_map.flow_fields), 2)
+    self.assertNotIn(goals[0], realm_map.flow_fields)  # least recently used
+    self.assertIs(realm_map.flow_field(goals[2]), fields[2])
+    self.assertTrue(np.array_equal(realm_map.flow_field(goals[0]), fields[0]))
+
+  def test_flow_fields_reset_with_map(self):
+    # Computed on first use by default
+    env = nmmo.Env(nmmo.config.Default(), seed=0)
+    env.reset(seed=0)
+    self.assertNotIn(env.realm.map.center_coord, env.realm.map.flow_fields)
+
+    config = nmmo.config.Default()
+    config.set("MAP_PRECOMPUTE_FLOW_FIELDS", True)
+    env = nmmo.Env(config, seed=0)
+    env.reset(seed=0)
+    realm_map = env.realm.map
+    self.assertIn(realm_map.center_coord, realm_map.flow_fields)
+    for goal in realm_map.quad_centers.values():
+      self.assertIn(goal, realm_map.flow_fields)
+
+    env.reset(seed=1)
+    habitable = realm_map.habitable_tiles.astype(bool)
+    goal = realm_map.center_coord
+    dist = bfs_distance(habitable, goal)
+    if not habitable[goal]:  # unreachable, entities fall back to A*
+      dist[:] = -1
+    self.assertTrue(np.array_equal(realm_map.flow_field(goal) >= 0, dist > 0))
+
+  def test_astar_matches_reference(self):
+    realm_map = self.env.realm.map
+    ref_map = SimpleNamespace(tiles=realm_map.tiles, habitable_tiles=realm_map.habitable_tiles)
+    np_random = np.random.default_rng(0)
+    sz = self.config.MAP_SIZE
+    habitable = np.argwhere(realm_map.habitable_tiles)
+    for cutoff in [astar.CUTOFF, 10]:
+      for _ in range(200):
+        start = tuple(int(x) for x in habitable[np_random.integers(len(habitable))])
+        # Mostly nearby goals, as used by the NPCs, and some far away
+        goal = tuple(int(x) for x in np.clip(start + np_random.integers(-12, 13, 2), 0, sz-1))
+        if np_random.random() < 0.2:
+          goal = tuple(int(x) for x in np_random.integers(0, sz, 2))
+
+        realm_map.pathfinding_cache.clear()
+        ref_map.pathfinding_cache = {}
+        self.assertEqual(astar.aStar(realm_map, start, goal, cutoff),
+                         aStar_ref(ref_map, start, goal, cutoff))
+        # pylint: disable=protected-access
+        self.assertDictEqual(dict(realm_map.pathfinding_cache._cache), ref_map.pathfinding_cache)
+
+  def test_astar_goal_out_of_grid(self):
+    # Far goals move toward the closest tile found, without wrapping around the grid
+    realm_map = self.env.realm.map
+    ref_map = SimpleNamespace(tiles=realm_map.tiles, habitable_tiles=realm_map.habitable_tiles)
+    habitable = np.argwhere(realm_map.habitable_tiles)
+    sz = self.config.MAP_SIZE
+    for start in [tuple(int(x) for x in habitable[idx]) for idx in [0, len(habitable)//2, -1]]:
+      for goal in [(-5, start[1]), (start[0], -5), (sz + 5, start[1]), (-100, -100),
+                   (start[0], 3 * sz)]:
+        for cutoff in [astar.CUTOFF, 10, 10**6]:
+          realm_map.pathfinding_cache.clear()
+          ref_map.pathfinding_cache = {}
+          step = astar.aStar(realm_map, start, goal, cutoff)
+          self.assertEqual(step, aStar_ref(ref_map, start, goal, cutoff))
+          # pylint: disable=protected-access
+          self.assertDictEqual(dict(realm_map.pathfinding_cache._cache),
+                               ref_map.pathfinding_cache)
+
+if __name__ == '__main__':
+  unittest.main()
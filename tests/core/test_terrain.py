@@ -0,0 +1,235 @@
+# pylint: disable=protected-access
+import os
+import tempfile
+import unittest
+import numpy as np
+from imageio.v2 import imread
+
+import nmmo
+from nmmo.core import terrain
+from nmmo.core.terrain import Terrain
+from nmmo.lib import seeding, vec_noise
+
+
+# Reference implementations: the per-tile loops replaced by the array versions
+def fractal_to_material_ref(config, fractal):
+  size = config.MAP_SIZE
+  matl_map = np.zeros((size, size), dtype=np.int16)
+  for y in range(size):
+    for x in range(size):
+      v = fractal[y, x]
+      if v <= config.TERRAIN_WATER:
+        mat = Terrain.WATER
+      elif v <= config.TERRAIN_GRASS:
+        mat = Terrain.GRASS
+      elif v <= config.TERRAIN_FOILAGE:
+        mat = Terrain.FOILAGE
+      else:
+        mat = Terrain.STONE
+      matl_map[y, x] = mat
+  return matl_map
+
+def place_fish_ref(tiles, mmin, mmax, np_random, num_fish):
+  placed = 0
+  water_loc = np.where(tiles == Terrain.WATER)
+  water_loc = [(r, c) for r, c in zip(water_loc[0], water_loc[1])
+              if mmin < r < mmax and mmin < c < mmax]
+  np_random.shuffle(water_loc)
+  allow = {Terrain.GRASS}
+  for r, c in water_loc:
+    if tiles[r-1, c] in allow or tiles[r+1, c] in allow or \
+       tiles[r, c-1] in allow or tiles[r, c+1] in allow:
+      tiles[r, c] = Terrain.FISH
+      placed += 1
+    if placed == num_fish:
+      break
+
+def uniform_ref(tiles, mat, mmin, mmax, np_random):
+  r = np_random.integers(mmin, mmax)
+  c = np_random.integers(mmin, mmax)
+  if tiles[r, c] not in {Terrain.GRASS}:
+    uniform_ref(tiles, mat, mmin, mmax, np_random)
+  else:
+    tiles[r, c] = mat
+
+def cluster_ref(tiles, mat, mmin, mmax, np_random):
+  r = np_random.integers(mmin + 1, mmax - 1)
+  c = np_random.integers(mmin + 1, mmax - 1)
+  if tiles[r, c] != Terrain.GRASS:
+    cluster_ref(tiles, mat, mmin, mmax, np_random)
+    return
+  tiles[r, c] = mat
+  for nr, nc in [(r-1, c), (r+1, c), (r, c-1), (r, c+1)]:
+    if tiles[nr, nc] == Terrain.GRASS:
+      tiles[nr, nc] = mat
+
+def spawn_profession_resources_ref(config, tiles, np_random):
+  mmin = config.MAP_BORDER + 1
+  mmax = config.MAP_SIZE - config.MAP_BORDER - 1
+  for _ in range(config.PROGRESSION_SPAWN_CLUSTERS):
+    cluster_ref(tiles, Terrain.ORE, mmin, mmax, np_random)
+    cluster_ref(tiles, Terrain.TREE, mmin, mmax, np_random)
+    cluster_ref(tiles, Terrain.CRYSTAL, mmin, mmax, np_random)
+  for _ in range(config.PROGRESSION_SPAWN_UNIFORMS):
+    uniform_ref(tiles, Terrain.HERB, mmin, mmax, np_random)
+  place_fish_ref(tiles, mmin, mmax, np_random, config.PROGRESSION_SPAWN_UNIFORMS)
+
+def scatter_extra_resources_ref(config, tiles, np_random, density_factor=6):
+  center = config.MAP_CENTER
+  mmin = config.MAP_BORDER + 1
+  mmax = config.MAP_SIZE - config.MAP_BORDER - 1
+  water_to_add, water_added = (center//density_factor)**2, 0
+  food_to_add, food_added  = (center//density_factor)**2, 0
+  while water_added < water_to_add or food_added < food_to_add:
+    r, c = tuple(np_random.integers(mmin, mmax, size=(2,)))
+    if water_added < water_to_add and tiles[r, c] == Terrain.GRASS:
+      tiles[r, c] = Terrain.WATER
+      water_added += 1
+    if food_added < food_to_add and tiles[r, c] == Terrain.GRASS:
+      tiles[r, c] = Terrain.FOILAGE
+      food_added += 1
+
+
+def snoise2_ref(x, y):
+  s = (x + y) * vec_noise.F2
+  i = np.floor(x + s).astype(int)
+  j = np.floor(y + s).astype(int)
+  t = (i + j) * vec_noise.G2
+  x0 = x - (i - t)
+  y0 = y - (j - t)
+  i1 = (x0 > y0).astype(int)
+  j1 = 1 - i1
+  x1 = x0 - i1 + vec_noise.G2
+  y1 = y0 - j1 + vec_noise.G2
+  x2 = x0 - 1 + 2 * vec_noise.G2
+  y2 = y0 - 1 + 2 * vec_noise.G2
+  perm, grad = vec_noise.PERM, vec_noise.GRAD3
+  ii = i & 255
+  jj = j & 255
+  gi0 = perm[ii + perm[jj]] % 12
+  gi1 = perm[ii + i1 + perm[jj + j1]] % 12
+  gi2 = perm[ii + 1 + perm[jj + 1]] % 12
+  t0 = 0.5 - x0**2 - y0**2
+  t1 = 0.5 - x1**2 - y1**2
+  t2 = 0.5 - x2**2 - y2**2
+  n0 = (t0 >= 0) * t0**4 * (grad[gi0, 0] * x0 + grad[gi0, 1] * y0)
+  n1 = (t1 >= 0) * t1**4 * (grad[gi1, 0] * x1 + grad[gi1, 1] * y1)
+  n2 = (t2 >= 0) * t2**4 * (grad[gi2, 0] * x2 + grad[gi2, 1] * y2)
+  return 70 * (n0 + n1 + n2)
+
+
+class TestTerrain(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    class MapConfig(nmmo.config.Small, nmmo.config.Terrain,
+                    nmmo.config.Item, nmmo.config.Profession):
+      PATH_MAPS = 'maps/test_terrain'
+      MAP_RESET_FROM_FRACTAL = True
+    cls.config = MapConfig()
+    cls.env = nmmo.Env(cls.config)
+    cls.fractal = cls.env._load_map_file(1)["fractal"]
+
+  def test_fractal_to_material(self):
+    self.assertTrue(np.array_equal(terrain.fractal_to_material(self.config, self.fractal),
+                                   fractal_to_material_ref(self.config, self.fractal)))
+    all_grass = terrain.fractal_to_material(self.config, self.fractal, all_grass=True)
+    self.assertTrue(np.all(all_grass == Terrain.GRASS))
+
+  def test_resources_match_reference(self):
+    for seed in range(10):
+      tiles = terrain.fractal_to_material(self.config, self.fractal)
+      ref_tiles = tiles.copy()
+      np_random = seeding.np_random(seed)[0]
+      ref_random = seeding.np_random(seed)[0]
+
+      terrain.spawn_profession_resources(self.config, tiles, np_random)
+      terrain.scatter_extra_resources(self.config, tiles, np_random)
+      spawn_profession_resources_ref(self.config, ref_tiles, ref_random)
+      scatter_extra_resources_ref(self.config, ref_tiles, ref_random)
+
+      self.assertTrue(np.array_equal(tiles, ref_tiles))
+      # Both must leave the generator in the same state
+      self.assertEqual(np_random.integers(2**31), ref_random.integers(2**31))
+
+  def test_snoise2(self):
+    X, Y = np.meshgrid(np.arange(200), np.arange(200))
+    for seed, freq in [(1, 0.05), (-3, 0.4), (12, 1.7)]:
+      x, y = seed*200 + freq*X, 7*200 + freq*Y
+      ref = snoise2_ref(x, y)
+      self.assertTrue(np.array_equal(vec_noise.snoise2(x, y), ref))
+      self.assertTrue(np.array_equal(vec_noise.snoise2(x, y, chunk_size=999), ref))
+
+      fast = vec_noise.snoise2(x, y, dtype=np.float32, chunk_size=999)
+      self.assertEqual(fast.dtype, np.float32)
+      self.assertTrue(np.allclose(fast, ref, rtol=0, atol=1e-5))
+
+  def test_noise_options(self):
+    class NoiseConfig(nmmo.config.Medium, nmmo.config.Terrain):
+      pass
+    config = NoiseConfig()
+    ref_val, ref_tiles, _ = Terrain.generate_terrain(config, 0, None)
+
+    # Memoized noise layers are reused for other interpolation settings
+    config.set("TERRAIN_NOISE_CACHE_MB", 64)
+    terrain._NOISE_CACHE.clear()
+    val, tiles, _ = Terrain.generate_terrain(config, 0, None)
+    self.assertEqual(len(terrain._NOISE_CACHE), 1)
+    self.assertTrue(np.array_equal(val, ref_val))
+    self.assertTrue(np.array_equal(tiles, ref_tiles))
+    cached = next(iter(terrain._NOISE_CACHE.values()))
+    other_val, _, _ = Terrain.generate_terrain(config, 0, [0.5])
+    self.assertIs(next(iter(terrain._NOISE_CACHE.values())), cached)
+    self.assertFalse(np.array_equal(other_val, ref_val))
+    terrain._NOISE_CACHE.clear()
+
+    config.set("TERRAIN_NOISE_CACHE_MB", 0)
+    config.set("TERRAIN_NOISE_FLOAT32", True)
+    val, tiles, _ = Terrain.generate_terrain(config, 0, None)
+    self.assertTrue(np.allclose(val, ref_val, rtol=0, atol=1e-5))
+    self.assertEqual(len(terrain._NOISE_CACHE), 0)
+
+  def test_tiled_generation(self):
+    class TiledConfig(nmmo.config.Medium, nmmo.config.Terrain):
+      pass
+    config = TiledConfig()
+    ref_val, ref_tiles, _ = Terrain.generate_terrain(config, 0, None)
+
+    for chunk_rows in [7, 64, 1000]:
+      config = TiledConfig()
+      config.set("TERRAIN_CHUNK_ROWS", chunk_rows)
+      val, tiles, _ = Terrain.generate_terrain(config, 0, None)
+      self.assertIsInstance(val, np.memmap)
+      self.assertTrue(np.allclose(val, ref_val, rtol=0, atol=1e-9))
+      self.assertTrue(np.array_equal(tiles, ref_tiles))
+
+  def test_tiled_generation_env(self):
+    class TiledConfig(nmmo.config.Small, nmmo.config.Terrain,
+                      nmmo.config.Item, nmmo.config.Profession):
+      PATH_MAPS = 'maps/test_tiled'
+      TERRAIN_CHUNK_ROWS = 16
+    env = nmmo.Env(TiledConfig(), seed=0)
+    self.assertTrue(np.any(env._load_map_file(1)["map"] == Terrain.FISH))
+    env.reset(seed=0)
+
+  def test_render_preview(self):
+    map_gen = terrain.MapGenerator(self.config)
+    b = self.config.MAP_BORDER
+    tiles = terrain.fractal_to_material(self.config, self.fractal)
+    tiles = terrain.process_map_border(self.config, tiles)[b:-b+1, b:-b+1]
+    ref_image = np.vstack([np.hstack([map_gen.textures[e] for e in l]) for l in tiles])
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      path = os.path.join(tmp_dir, 'map.png')
+      terrain.Save.render(tiles, map_gen.texture_atlas, path)
+      self.assertTrue(np.array_equal(imread(path), ref_image))
+      terrain.Save.render(tiles, map_gen.textures, path)  # dict lookup is still supported
+      self.assertTrue(np.array_equal(imread(path), ref_image))
+
+      # Fast preview: one pixel per tile
+      terrain.Save.render(tiles, map_gen.texture_colors, path)
+      image = imread(path)
+      self.assertEqual(image.shape, (*tiles.shape, 3))
+      self.assertTrue(np.array_equal(image[0, 0], map_gen.texture_colors[tiles[0, 0], 0, 0]))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,8 +1,11 @@
 import unittest
 
 import copy
+import numpy as np
 import nmmo
-from scripted.baselines import Sleeper
+from nmmo.lib import astar
+from nmmo.lib.astar import PathfindingCache
+from scripted.baselines import Fisher, Forage, Sleeper
 
 HORIZON = 32
 
@@ -32,5 +35,76 @@ class TestTileProperty(unittest.TestCase):
     end_passable = [tile.impassible for tile in self.end.map.tiles.flatten()]
     self.assertListEqual(start_passable, end_passable)
 
+  def test_map_repr_and_packet(self):
+    for realm in [self.start, self.end]:
+      tiles = realm.map.tiles
+      # repr is the material index of every tile, as loaded, even if depleted since
+      expected = [[t.material.index for t in row] for row in tiles]
+      self.assertTrue(np.array_equal(realm.map.repr, expected))
+      self.assertIs(realm.map.repr, realm.map.repr)
+
+      packet = realm.map.packet
+      self.assertEqual(packet.shape, (len(realm.map.update_list), 2))
+      self.assertListEqual(packet.tolist(), [list(t.pos) for t in realm.map.update_list])
+
+    # packet follows harvests
+    realm = copy.deepcopy(self.start)
+    self.assertEqual(len(realm.map.packet), len(realm.map.update_list))
+    tile = next(t for t in realm.map.tiles.flatten() if t.state in nmmo.material.Harvestable
+                and not t.depleted and t not in realm.map.update_list)
+    realm.map.harvest(*tile.pos)
+    self.assertListEqual(realm.map.packet[-1].tolist(), list(tile.pos))
+
+  def test_state_and_adjacency_grids(self):
+    config = nmmo.config.Default()
+    config.PLAYERS = [Fisher, Forage]
+    env = nmmo.Env(config, seed=0)
+    env.reset(seed=0)
+
+    def check_grids(realm_map):
+      states = np.array([[t.state.index for t in row] for row in realm_map.tiles])
+      self.assertTrue(np.array_equal(realm_map.state_map, states))
+      for idx, count in realm_map.adjacent.items():
+        padded = np.pad(states == idx, 1)
+        expected = padded[:-2, 1:-1].astype(int) + padded[2:, 1:-1] \
+                   + padded[1:-1, :-2] + padded[1:-1, 2:]
+        self.assertTrue(np.array_equal(count, expected))
+
+    check_grids(env.realm.map)
+    fish = nmmo.material.Fish.index
+    start_fish = np.sum(env.realm.map.state_map == fish)
+    for _ in range(HORIZON):
+      env.step({})
+    check_grids(env.realm.map)
+    self.assertTrue(np.sum(env.realm.map.state_map == fish) < start_fish)  # fish were caught
+
+  def test_pathfinding_cache(self):
+    cache = PathfindingCache(max_size=2)
+    cache.put(((0, 0), (0, 2)), (0, 1))
+    cache.put(((0, 0), (2, 0)), (1, 0))
+    self.assertEqual(cache.get(((0, 0), (0, 2))), (0, 1))
+    cache.put(((0, 0), (0, -2)), (0, -1))  # evicts the least recently used entry
+    self.assertIsNone(cache.get(((0, 0), (2, 0))))
+    self.assertEqual(len(cache), 2)
+    self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    config = nmmo.config.Default()
+    config.set("MAP_PATHFINDING_CACHE_SIZE", 64)
+    env = nmmo.Env(config, seed=0)
+    env.reset(seed=0)
+    realm_map = env.realm.map
+    rows, cols = np.nonzero(realm_map.habitable_tiles)
+    start, goal = (rows[0], cols[0]), (rows[-1], cols[-1])
+    step = astar.aStar(realm_map, start, goal)
+    self.assertEqual(realm_map.pathfinding_cache.misses, 1)
+    self.assertEqual(astar.aStar(realm_map, start, goal), step)
+    self.assertEqual(realm_map.pathfinding_cache.hits, 1)
+    self.assertTrue(0 < len(realm_map.pathfinding_cache) <= 64)
+
+    # Paths computed on one map must not be reused on the next
+    env.reset(seed=1)
+    self.assertEqual(len(realm_map.pathfinding_cache), 0)
+    self.assertEqual(realm_map.pathfinding_cache.hits, 0)
+
 if __name__ == '__main__':
   unittest.main()
@@ -28,6 +28,15 @@ class TestNumpyTable(unittest.TestCase):
       np.array([[0, 0, 0], [11, 12, 0], [51, 0, 53]], dtype=np.int32)
     )
 
+  def test_column_ops(self):
+    table = NumpyTable(3, 10, np.int16)
+    rows = np.array([2, 5, 7])
+    table.set_column(rows, 1, [4, 5, 6])
+    table.set_column(rows[:2], 2, 9)
+    np.testing.assert_array_equal(table.get_column(rows, 1), [4, 5, 6])
+    np.testing.assert_array_equal(table.get_column(rows, np.array([1, 2, 0])), [4, 9, 0])
+    np.testing.assert_array_equal(table.get([5]), [[0, 5, 9]])
+
   def test_expand(self):
     table = NumpyTable(3, 10, np.float32)
 
@@ -1,7 +1,9 @@
 from collections import defaultdict
 import unittest
+from types import SimpleNamespace
 
-from nmmo.datastore.serialized import SerializedState
+from nmmo.datastore.numpy_datastore import NumpyDatastore
+from nmmo.datastore.serialized import SerializedState, StatePool
 
 # pylint: disable=no-member,unused-argument,unsubscriptable-object
 
@@ -9,6 +11,8 @@ FooState = SerializedState.subclass("FooState", [
   "a", "b", "col"
 ])
 
+BarState = SerializedState.subclass("BarState", ["id", "a", "b"], table_attributes=["b"])
+
 FooState.Limits = {
   "a": (-10, 10),
 }
@@ -52,5 +56,59 @@ class TestSerialized(unittest.TestCase):
     state.a.update(a_max + 100)
     self.assertEqual(state.a.val, a_max)
 
+  def test_state_pool(self):
+    datastore = MockDatastore()
+    pool = StatePool()
+    realm = SimpleNamespace(pool=pool)
+    state = FooState(datastore, FooState.Limits)
+    state.a.update(5)
+    state.extra = "set after init"
+    record = state.datastore_record
+
+    pool.release(state)
+    pool.release(state)  # released once
+    self.assertEqual(len(pool), 0)  # pending until recycled
+    pool.recycle()
+    self.assertEqual(len(pool), 1)
+
+    recycled = StatePool.new(FooState, realm)
+    self.assertIs(recycled, state)
+    self.assertEqual(len(pool), 0)
+    recycled.__init__(datastore)  # pylint: disable=unnecessary-dunder-call
+
+    # Same as a new object, without limits
+    self.assertIsNot(recycled.datastore_record, record)
+    self.assertFalse(hasattr(recycled, "extra"))
+    for attr in ["a", "b", "col"]:
+      self.assertEqual(getattr(recycled, attr).val, 0)
+      self.assertIs(getattr(recycled, attr).datastore_record, recycled.datastore_record)
+    recycled.a.update(100)
+    self.assertEqual(recycled.a.val, 100)
+
+    # Without a pool, or with an empty one, objects are new
+    self.assertIsNot(StatePool.new(FooState, realm), state)
+    self.assertIsNot(StatePool.new(FooState, SimpleNamespace()), state)
+
+  def test_deleted_record(self):
+    datastore = NumpyDatastore()
+    datastore.register_object_type("BarState", BarState.State.num_attributes)
+    table = BarState.State.table(datastore)
+    state = BarState(datastore)
+    row, col = state.datastore_record.id, BarState.State.attr_name_to_col["b"]
+    state.a.update(3)
+    table.set_column([row], col, 5)
+
+    # A deleted record keeps its last values, and no longer touches its row,
+    # which can be reused by another record
+    state.datastore_record.delete()
+    table.set_column([row], col, 7)
+    self.assertEqual((state.a.val, state.b.val), (3, 5))
+    state.b.update(6)
+    self.assertEqual((state.b.val, int(table.get_column(row, col))), (6, 7))
+
+    # Table attributes only hold integers
+    with self.assertRaises(AssertionError):
+      BarState(datastore).b.update(1.5)
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import numpy as np
+
+import nmmo
+from nmmo.core import action as Action
+from nmmo.core.config import original_combat_damage_formula
+from nmmo.entity.entity import EntityState
+from nmmo.lib.event_code import EventCode
+from nmmo.systems import combat
+from nmmo.systems.item import Hat, Spear, Arrow
+from scripted.baselines import Mage, Melee, Range
+
+
+# pylint: disable=unused-argument
+def custom_damage_formula(self, offense, defense, multiplier, minimum_proportion):
+  return offense * multiplier / (1 + defense)
+
+class TestCombat(unittest.TestCase):
+  def _make_env(self, batched, formula=None):
+    config = nmmo.config.Default()
+    config.set("PLAYERS", [Melee, Range, Mage])
+    config.set("COMBAT_SPAWN_IMMUNITY", 0)
+    config.set("NPC_SPAWN_AGGRESSIVE", 0.5)
+    config.set("COMBAT_BATCH_ATTACKS", batched)
+    if formula is not None:
+      config.COMBAT_DAMAGE_FORMULA = formula.__get__(config)
+    env = nmmo.Env(config, seed=0)
+    env.reset(seed=0)
+    return env
+
+  def test_batch_damage(self):
+    for formula in [None, original_combat_damage_formula,
+                    custom_damage_formula]:
+      env = self._make_env(True, formula)
+      realm = env.realm
+      np_random = np.random.default_rng(0)
+      entities = list(realm.players.values()) + list(realm.npcs.values())
+      for ent in realm.players.values():
+        for skill in [ent.skills.melee, ent.skills.range, ent.skills.mage, ent.skills.fishing]:
+          skill.add_xp(int(np_random.integers(0, 400)))
+        for item in [Hat(realm, 1), Spear(realm, 1), Arrow(realm, 1)]:
+          ent.inventory.receive(item)
+          item.use(ent)
+
+      attackers, targets, skills = [], [], []
+      for _ in range(256):
+        attacker, target = np_random.choice(entities, 2, replace=False)
+        style = [Action.Melee, Action.Range, Action.Mage][np_random.integers(3)]
+        attackers.append(attacker)
+        targets.append(target)
+        skills.append(style.skill(attacker))
+
+      damage = combat.batch_damage(realm, attackers, targets, skills)
+      self.assertListEqual(
+        damage.tolist(),
+        [combat.attack_damage(realm.config, attacker, target, skill)
+         for attacker, target, skill in zip(attackers, targets, skills)])
+
+  def test_batched_attacks(self):
+    batched, per_attack = self._make_env(True), self._make_env(False)
+    for _ in range(128):
+      batched.step({})
+      per_attack.step({})
+    self.assertListEqual(list(batched.realm.players), list(per_attack.realm.players))
+    self.assertTrue(np.array_equal(EntityState.Query.table(batched.realm.datastore),
+                                   EntityState.Query.table(per_attack.realm.datastore)))
+    self.assertTrue(np.array_equal(batched.realm.event_log.get_data(),
+                                   per_attack.realm.event_log.get_data()))
+    for code in [EventCode.SCORE_HIT, EventCode.PLAYER_KILL]:
+      self.assertTrue(len(batched.realm.event_log.get_data(event_code=code)) > 0)
+
+if __name__ == '__main__':
+  unittest.main()
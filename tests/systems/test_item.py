@@ -3,7 +3,8 @@ import numpy as np
 
 import nmmo
 from nmmo.datastore.numpy_datastore import NumpyDatastore
-from nmmo.systems.item import Hat, Top, ItemState
+from nmmo.systems.item import Hat, Top, Spear, Arrow, ItemState
+from nmmo.systems.inventory import Equipment
 from nmmo.systems.exchange import Exchange
 
 class MockRealm:
@@ -68,5 +69,33 @@ class TestItem(unittest.TestCase):
 
     self.assertEqual(Hat.Query.owned_by(realm.datastore, 2).size, 0)
 
+  def test_equipment_aggregates(self):
+    realm = MockRealm()
+    equipment = Equipment()
+
+    def check_totals():
+      for attr in Equipment.AGGREGATES:
+        prop = 'item_level' if attr == 'level' else attr
+        self.assertEqual(getattr(equipment, prop),
+                         equipment.total(lambda e, attr=attr: getattr(e, attr)))
+
+    check_totals()
+    hat, spear, arrow = Hat(realm, 3), Spear(realm, 5), Arrow(realm, 2)
+    for slot, item in [(equipment.hat, hat), (equipment.held, spear),
+                       (equipment.ammunition, arrow)]:
+      item.equipped.update(1)
+      slot.equip(item)
+      check_totals()
+    self.assertEqual(equipment.item_level, 10)
+    self.assertEqual(equipment.range_attack, arrow.range_attack.val)
+
+    # Swapping and unequipping items refresh the cached totals
+    spear.unequip(equipment.held)
+    check_totals()
+    equipment.hat.unequip()
+    equipment.hat.equip(Hat(realm, 7))
+    check_totals()
+    self.assertEqual(equipment.item_level, 9)
+
 if __name__ == '__main__':
   unittest.main()
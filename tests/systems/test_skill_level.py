@@ -4,6 +4,8 @@ import numpy as np
 
 import nmmo
 import nmmo.systems.skill
+from nmmo.lib.event_code import EventCode
+from nmmo.lib.event_log import EventAttr
 from tests.testhelpers import ScriptedAgentTestConfig, ScriptedAgentTestEnv
 
 
@@ -35,6 +37,10 @@ class TestSkillLevel(unittest.TestCase):
     self.assertEqual(exp_calculator.level_at_exp(50), 6)
     self.assertEqual(exp_calculator.level_at_exp(100), 6)
 
+    exp = np.arange(120)
+    self.assertListEqual(exp_calculator.levels_at_exp(exp).tolist(),
+                         [exp_calculator.level_at_exp(e) for e in exp])
+
   def test_add_xp(self):
     self.env.reset()
     player = self.env.realm.players[1]
@@ -70,6 +76,32 @@ class TestSkillLevel(unittest.TestCase):
         self.assertEqual(getattr(player.skills, skill).level.val, 1)
         self.assertEqual(getattr(player.skills, skill).exp.val, 0)
 
+  def test_batched_add_xp(self):
+    self.env.reset()
+    realm = self.env.realm
+    xp = [5, 10, 25, 100]
+    scalar_ids, batch_ids = [1, 2, 3, 4], [5, 6, 7, 8]
+    for ent_id, amount in zip(scalar_ids, xp):
+      realm.players[ent_id].skills.range.add_xp(amount)
+    nmmo.systems.skill.add_xp(realm, batch_ids, "range", xp)
+    nmmo.systems.skill.add_xp(realm, batch_ids[:2], "fishing", 20)
+
+    for scalar_id, batch_id in zip(scalar_ids, batch_ids):
+      scalar, batch = realm.players[scalar_id].skills, realm.players[batch_id].skills
+      self.assertEqual(batch.range.exp.val, scalar.range.exp.val)
+      self.assertEqual(batch.range.level.val, scalar.range.level.val)
+    self.assertListEqual([realm.players[ent_id].skills.fishing.level.val for ent_id in batch_ids],
+                         [3, 3, 1, 1])
+
+    # LEVEL_UP is recorded only for the players that leveled up
+    log = realm.event_log.get_data(event_code=EventCode.LEVEL_UP)
+    ent_col = EventAttr["ent_id"]
+    level_col = EventAttr["level"]
+    scalar_log = log[np.isin(log[:, ent_col], scalar_ids)]
+    batch_log = log[np.isin(log[:, ent_col], batch_ids)]
+    self.assertListEqual(scalar_log[:, level_col].tolist(), [2, 3, 6])
+    self.assertListEqual(batch_log[:, level_col].tolist(), [2, 3, 6, 3, 3])
+    self.assertListEqual(batch_log[:, ent_col].tolist(), [6, 7, 8, 5, 6])
 
 if __name__ == '__main__':
   unittest.main()
@@ -1,6 +1,9 @@
 # pylint: disable=protected-access, no-member
 import unittest
+import numpy as np
 import nmmo
+from nmmo.entity.entity import EntityState
+from scripted import baselines
 
 
 class TestDeathFog(unittest.TestCase):
@@ -41,5 +44,55 @@ class TestDeathFog(unittest.TestCase):
     self.assertEqual(env.realm.fog_map[border,border], config.DEATH_FOG_SPEED*4)
     self.assertEqual(env.realm.fog_map[border+1,border+1], -1 + config.DEATH_FOG_SPEED*4)
 
+  def test_fog_map_matches_accumulation(self):
+    for speed in [1/2, 1/10, 1/16]:
+      config = nmmo.config.Default()
+      config.set("DEATH_FOG_ONSET", 2)
+      config.set("DEATH_FOG_SPEED", speed)
+      config.set("DEATH_FOG_FINAL_SIZE", 8)
+      config.set("PROVIDE_DEATH_FOG_OBS", True)
+      env = nmmo.Env(config)
+      env.reset()
+
+      # Reference: the initial fog map built ring by ring, then accumulated every tick
+      size, center, safe = config.MAP_SIZE, config.MAP_SIZE // 2, config.DEATH_FOG_FINAL_SIZE
+      fog_map = np.zeros((size, size))
+      dist = -config.MAP_BORDER
+      for i in range(center):
+        fog_map[i:size-i, i:size-i] = -dist
+        dist += 1
+      fog_map[center-safe:center+safe+1, center-safe:center+safe+1] = -size
+      self.assertTrue(np.array_equal(env.realm.fog_map, fog_map))
+
+      for _ in range(40):
+        env.step({})
+        if env.realm.tick >= config.DEATH_FOG_ONSET:
+          fog_map += speed
+          fog_map[center-safe:center+safe+1, center-safe:center+safe+1] = -size
+        self.assertTrue(np.allclose(env.realm.fog_map, fog_map, atol=1e-4))
+        # The fog obs is only refreshed when the rounded values can change
+        self.assertTrue(np.array_equal(env.tile_map[:, :, -1], np.round(env.realm.fog_map)))
+
+  def test_batched_fog_damage(self):
+    def run_env(batched):
+      config = nmmo.config.Default()
+      config.set("PLAYERS", [baselines.Random])
+      config.set("DEATH_FOG_ONSET", 1)
+      config.set("DEATH_FOG_SPEED", 1/3)
+      config.set("DEATH_FOG_FINAL_SIZE", 4)
+      env = nmmo.Env(config, seed=0)
+      if not batched:  # per-player fog_map lookup in Player.update
+        env.realm.players._fog_damage = lambda: None
+      env.reset(seed=0)
+      for _ in range(64):
+        env.step({})
+      return env
+
+    batched, per_player = run_env(True), run_env(False)
+    self.assertTrue(len(batched.realm.players) < batched.config.PLAYER_N)  # some died of fog
+    self.assertListEqual(list(batched.realm.players), list(per_player.realm.players))
+    self.assertTrue(np.array_equal(EntityState.Query.table(batched.realm.datastore),
+                                   EntityState.Query.table(per_player.realm.datastore)))
+
 if __name__ == '__main__':
   unittest.main()
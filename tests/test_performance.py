@@ -12,6 +12,9 @@ from nmmo.core.config import (NPC, AllGameSystems, Combat, Communication,
 from nmmo.task.task_api import nmmo_default_task, make_same_task
 from nmmo.task.base_predicates import CountEvent, FullyArmed
 from nmmo.systems.skill import Melee
+from nmmo.minigames import KingoftheHill
+from nmmo.core.terrain import MapGenerator, Terrain as TerrainGen
+from nmmo.lib import team_helper
 from tests.testhelpers import profile_env_step
 from scripted import baselines
 
@@ -53,6 +56,25 @@ def test_small_env_reset(benchmark):
   env = nmmo.Env(config)
   benchmark(lambda: env.reset(map_id=1))
 
+def test_terrain_noise(benchmark):
+  config = create_config(Medium, Terrain)
+  MapGenerator(config)
+  benchmark(lambda: TerrainGen.generate_terrain(config, 0, None))
+
+def test_terrain_noise_float32(benchmark):
+  config = create_config(Medium, Terrain)
+  config.set("TERRAIN_NOISE_FLOAT32", True)
+  MapGenerator(config)
+  benchmark(lambda: TerrainGen.generate_terrain(config, 0, None))
+
+def test_fractal_reset_minigame(benchmark):
+  # KingoftheHill regenerates the map from the fractal on every reset
+  config = nmmo.config.Default()
+  config.set("TEAMS", team_helper.make_teams(config, num_teams=16))
+  env = nmmo.Env(config)
+  game = KingoftheHill(env)
+  benchmark(lambda: env.reset(map_id=1, game=game))
+
 def test_fps_base_small_1_pop(benchmark):
   benchmark_config(benchmark, Small, 1)
 